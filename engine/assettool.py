@@ -0,0 +1,75 @@
+# Asset tools.
+# Builds and checks the asset manifest, and builds asset packs and texture atlases. Run this after changing anything in engine/assets.
+#
+# Examples:
+#   python -m engine.assettool manifest
+#   python -m engine.assettool verify
+#   python -m engine.assettool pack -o ./engine/assets.pack
+#   python -m engine.assettool atlas --max_sprite 256
+
+import argparse, os, time
+
+from engine.common.manifest import AssetManifest
+from engine.common.pack import AssetPack
+from engine.common.atlas import TextureAtlas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BasedEngine asset tools.")
+    parser.add_argument('command', help="Rebuild the asset 'manifest', 'verify' the assets against it, build an asset 'pack', or pack the images into a texture 'atlas'.", choices=['manifest', 'verify', 'pack', 'atlas'])
+    parser.add_argument('-a', '--assets', help="Asset folder to work on.", default='./engine/assets')
+    parser.add_argument('-o', '--output', help="Where to write the asset pack.", default='./engine/assets.pack')
+    parser.add_argument('--page_size', help="Atlas page width and max height, in pixels.", type=int, default=2048)
+    parser.add_argument('--max_sprite', help="Images bigger than this on either side stay out of the atlas.", type=int, default=512)
+    parser.add_argument('-j', '--jobs', help="How many files to hash at once. 0 picks based on the CPU.", type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = AssetManifest(args.assets)
+    started = time.perf_counter()
+
+    if args.command == 'manifest':
+        # Sound lengths need the mixer, but not real audio.
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        import pygame
+        try:
+            pygame.mixer.init()
+        except pygame.error:
+            pass
+
+        count = manifest.build(args.jobs)
+        manifest.save()
+        print(f"Wrote {count} assets to {manifest.path} in {(time.perf_counter()-started)*1000:.0f}ms.")
+
+    elif args.command == 'pack':
+        paths = manifest.listFiles()
+        size = AssetPack.build(args.assets, args.output, paths)
+        print(f"Packed {len(paths)} assets into {args.output} ({size/1048576:.1f} MB) in {(time.perf_counter()-started)*1000:.0f}ms.")
+
+    elif args.command == 'atlas':
+        import pygame
+        images = {}
+        for path in manifest.listFiles():
+            if path.startswith('images/') and path.lower().endswith('.png'):
+                surface = pygame.image.load(f"{args.assets}/{path}")
+                if max(surface.get_size()) <= args.max_sprite:
+                    images[path[len('images/'):]] = surface
+
+        atlas = TextureAtlas(args.page_size)
+        atlas.pack(images)
+        os.makedirs(f"{args.assets}/atlas", exist_ok=True)
+        for name in os.listdir(f"{args.assets}/atlas"):
+            os.remove(f"{args.assets}/atlas/{name}")
+        atlas.save(f"{args.assets}/atlas")
+        print(f"Packed {len(atlas)} images onto {len(atlas.pages)} pages in {args.assets}/atlas in {(time.perf_counter()-started)*1000:.0f}ms. Rebuild the manifest next.")
+
+    else:
+        if not manifest.load():
+            print(f"Couldn't load {manifest.path}! Build it with `python -m engine.assettool manifest`.")
+            exit(1)
+
+        problems = manifest.verify(args.jobs)
+        for path, problem in problems.items():
+            print(f"{path}: {problem}")
+        for path in set(manifest.listFiles())-set(manifest.files):
+            print(f"{path}: not in manifest")
+        print(f"Checked {len(manifest.files)} assets in {(time.perf_counter()-started)*1000:.0f}ms, {len(problems)} problems.")
+        exit(1 if problems else 0)
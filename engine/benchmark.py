@@ -0,0 +1,187 @@
+# Engine benchmark.
+# Runs the engine loop headless for a set number of frames per scenario, and reports timings as JSON.
+# Started with `start_engine --benchmark`, see engine.py.
+
+import json, os, sys, time
+
+from engine.common.constants import LogConstants
+from engine.common.profiler import FrameProfiler
+from engine.common.scene import Scene
+from engine.scenes import LogoTransition
+
+class MenuBenchmarkScene(Scene):
+    '''
+    The main test menu's layout, drawn through the shared text renderer every frame like
+    the test menu does. The selection moves every tick, so colors change.
+    '''
+    name = 'BENCH_MENU'
+    caption = '(benchmark)'
+    options = [
+        'Input Test',
+        'Game Options',
+        'Coin Options',
+        'Network Options',
+        'Input Options',
+        'All Factory Settings',
+        'Leave Test Mode'
+    ]
+    footers = ['UP/DOWN/F2 to move', 'ENTER to select']
+
+    def enter(self, previous: Scene) -> None:
+        self.current_select = 0
+
+    def update(self) -> None:
+        self.current_select = (self.current_select+1) % len(self.options)
+
+    def render(self, screen) -> None:
+        width, height = self.engine.resolution
+        scale = height/768
+        screen.fill((0, 0, 0))
+
+        self.engine.drawText(screen, 'system.ttf', int(50*scale), 'Test Menu', (255, 255, 255), (width/2, int(30*scale)), 1)
+        buffer = int(100*scale)
+        for index, option in enumerate(self.options):
+            color = (255, 0, 0) if index == self.current_select else (255, 255, 255)
+            self.engine.drawText(screen, 'system.ttf', int(25*scale), option, color, (width/2, buffer), 1)
+            buffer += int(30*scale)
+
+        buffer = 600
+        for footer in self.footers:
+            self.engine.drawText(screen, 'system.ttf', int(35*scale), footer, (255, 255, 255), (width/2, int(buffer*scale)), 1)
+            buffer += 50
+        self.engine.renderer.markAll()
+
+class EngineBenchmark:
+    '''
+    Drives the engine loop through each scenario for a set number of frames, with the
+    framerate uncapped, and collects frame timings from a fresh profiler per scenario.
+
+    Every scenario starts from an empty scene stack, so nothing from the last one, like
+    a transition still playing, gets timed with it. Each one also checks that its scene
+    actually drew, and says so in its results as `rendered`.
+
+    Scenarios:
+        - logo: the logo fade in, restarted whenever it finishes.
+        - menu: the main test menu, all text redrawn every frame.
+        - load: every image and sound decoded from scratch behind the loading screen.
+    '''
+    scenarios = ['logo', 'menu', 'load']
+
+    def __init__(self, engine, frames: int = 600) -> None:
+        self.engine = engine
+        self.frames = frames
+        engine.scenes.register(MenuBenchmarkScene)
+
+    @classmethod
+    def peakRss(self) -> float:
+        '''
+        Return the process's peak resident memory in MB, or None if we can't tell.
+        '''
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes.
+        return round(peak/1048576 if sys.platform == 'darwin' else peak/1024, 1)
+
+    def startScenario(self, name: str) -> None:
+        engine = self.engine
+        if name == 'logo':
+            engine.scenes.switch('LOGO_IN', transition=LogoTransition(engine, True))
+        elif name == 'menu':
+            engine.scenes.switch('BENCH_MENU')
+        elif name == 'load':
+            engine.image_cache.clear()
+            engine.sound_bank.clear()
+            # Packed assets might not be on disk, the manifest has them all either way.
+            for asset_path in list(engine.manifest.files) or engine.manifest.listFiles():
+                folder, asset_name = os.path.split(asset_path)
+                if folder == 'images':
+                    engine.loader.queue('image', asset_name, engine.assetSource(asset_path))
+                elif folder == 'sfx':
+                    engine.loader.queue('sound', asset_name, engine.assetSource(asset_path))
+            engine.scenes.switch('LOADING')
+
+    def runScenario(self, name: str) -> dict:
+        '''
+        Run one scenario. Returns its frame timings.
+        '''
+        engine = self.engine
+        engine.profiler = FrameProfiler(engine.logger, 0, True, self.frames)
+        engine.scenes.clear()
+        text_hits = engine.text.texts.stats()['hits']
+        loaded = engine.loader.finished
+        self.startScenario(name)
+        engine.timestep.reset()
+
+        load_time = None
+        logo_frames = 0
+        started = time.perf_counter()
+        for frame in range(self.frames+1):
+            if isinstance(engine.scenes.transition, LogoTransition):
+                logo_frames += 1
+            engine.runFrame()
+
+            # Keep the scenario going if its scene finished.
+            if name == 'logo' and engine.scenes.transition is None:
+                self.startScenario(name)
+            if name == 'load' and load_time is None and engine.loader.isDone():
+                load_time = time.perf_counter()-started
+        taken = time.perf_counter()-started
+
+        # Make sure we timed what we meant to, not some other scene.
+        if name == 'logo':
+            rendered = logo_frames > 0
+        elif name == 'menu':
+            rendered = engine.text.texts.stats()['hits'] > text_hits
+        else:
+            rendered = engine.loader.finished > loaded
+        if not rendered:
+            engine.logger.writeLogEntry(f"The {name} scenario didn't draw what it's meant to, its numbers are no good.", LogConstants.STATUS_WARNING, tool="BENCHMARK")
+
+        summary = engine.profiler.summary()
+        out = {
+            'frames': self.frames,
+            'rendered': rendered,
+            'seconds': round(taken, 3),
+            'fps': round(self.frames/taken, 1),
+            'frame_ms': summary['frame_ms'],
+            'spans_ms': summary['spans_ms']
+        }
+        if name == 'load':
+            out['load_ms'] = round(load_time*1000, 3) if load_time is not None else None
+        return out
+
+    def run(self, scenarios: list, startup: float) -> dict:
+        '''
+        Run the given scenarios in order. startup is how long the engine took to get going,
+        in seconds.
+
+        Returns: The results, ready to be written out as JSON.
+        '''
+        results = {
+            'version': 1,
+            'engine': self.engine.ver,
+            'resolution': list(self.engine.resolution),
+            'startup_ms': round(startup*1000, 3),
+            'scenarios': {}
+        }
+        for name in scenarios:
+            self.engine.logger.writeLogEntry(f'Benchmarking {name} for {self.frames} frames.', LogConstants.STATUS_OK_CYAN, tool="BENCHMARK")
+            results['scenarios'][name] = self.runScenario(name)
+        self.engine.scenes.clear()
+        results['peak_rss_mb'] = self.peakRss()
+        return results
+
+    @classmethod
+    def write(self, results: dict, path: str = None) -> None:
+        '''
+        Write the results to a file, or stdout without one.
+        '''
+        data = json.dumps(results, indent=4)
+        if path:
+            with open(path, 'w') as file:
+                file.write(data)
+        else:
+            print(data)
@@ -1,9 +1,19 @@
-from pygame import Surface, image, mixer
-import os
+from pygame import Surface, SRCALPHA, display, error, image, mixer, transform
+from concurrent.futures import Future, ThreadPoolExecutor
+import io, json, os, time
 
 from engine.common.validated import ValidatedDict
 from engine.common.constants import LogConstants
 from engine.common.logger import LogManager
+from engine.common.cache import LRUCache
+from engine.common.sound import ChannelPool
+from engine.common.music import MusicPlayer
+from engine.common.loader import AssetLoader
+from engine.common.manifest import AssetManifest
+from engine.common.pack import AssetPack
+from engine.common.pixelcache import PixelCache
+from engine.common.atlas import AtlasSprite, TextureAtlas
+from engine.common.text import TextRenderer
 
 class AssetManager:
     '''
@@ -11,47 +21,666 @@ class AssetManager:
     '''
     asset_prefix = "./engine/assets"
 
+    # Shared by every AssetManager, so the engine and the game use one texture store.
+    image_cache: LRUCache = None
+    sound_bank: LRUCache = None
+    channel_pool: ChannelPool = None
+    music: MusicPlayer = None
+    manifest: AssetManifest = None
+    pack: AssetPack = None
+    pixel_cache: PixelCache = None
+    atlas: TextureAtlas = None
+    text: TextRenderer = None
+    loader: AssetLoader = None
+
+    # Real resolution over the resolution the images were drawn for. Set by setResolution.
+    scale_factor: float = 1.0
+
     def __init__(self, config: ValidatedDict, logger: LogManager) -> None:
         self.logger = logger
         self.config = config
-    
+
+        if AssetManager.image_cache is None:
+            cache_mb = self.config.get_dict('assets').get_int('image_cache_mb', 256)
+            AssetManager.image_cache = LRUCache(cache_mb*1024*1024, AssetManager.surfaceBytes)
+
+        if AssetManager.sound_bank is None:
+            cache_mb = self.config.get_dict('assets').get_int('sound_cache_mb', 64)
+            AssetManager.sound_bank = LRUCache(cache_mb*1024*1024, AssetManager.soundBytes)
+
+        if AssetManager.manifest is None:
+            AssetManager.manifest = AssetManifest(self.asset_prefix)
+            AssetManager.manifest.load()
+        self.asset_check: Future = None
+
+        # Read assets out of a pack instead of loose files if we're told to.
+        asset_settings = self.config.get_dict('assets')
+        pack_path = asset_settings.get_str('pack')
+        if pack_path and AssetManager.pack is None:
+            if os.path.exists(pack_path):
+                AssetManager.pack = AssetPack.openShared(pack_path)
+                self.logger.writeLogEntry(f'Using asset pack {pack_path}, {len(self.pack.entries)} assets.', LogConstants.STATUS_OK_GREEN, tool="ASSET_MGR")
+            else:
+                self.logger.writeLogEntry(f'Couldn\'t find asset pack {pack_path}, using loose files.', LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+
+        # Decoded pixels on disk, so warm boots don't decode PNGs.
+        pixel_cache_dir = asset_settings.get_str('pixel_cache_dir', './cache/pixels')
+        if pixel_cache_dir and AssetManager.pixel_cache is None:
+            try:
+                AssetManager.pixel_cache = PixelCache(pixel_cache_dir)
+            except OSError as e:
+                self.logger.writeLogEntry(f'Couldn\'t use pixel cache {pixel_cache_dir}: {e}', LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+
+        if AssetManager.text is None:
+            AssetManager.text = TextRenderer.shared(asset_settings.get_int('font_cache', 32), asset_settings.get_int('text_cache_mb', 16))
+
+        if AssetManager.atlas is None:
+            AssetManager.atlas = TextureAtlas(asset_settings.get_int('atlas_page_size', 2048))
+
+        if AssetManager.loader is None:
+            AssetManager.loader = AssetLoader(asset_settings.get_int('loader_workers', 0), asset_settings.get_bool('loader_processes', False))
+
+    def initSound(self) -> None:
+        '''
+        Set up the channel pool and the music player. Run once the mixer is up.
+        '''
+        sound_settings = self.config.get_dict('sound')
+        if AssetManager.channel_pool is None:
+            AssetManager.channel_pool = ChannelPool(sound_settings, sound_settings.get_int('max_polyphony', 16))
+        if AssetManager.music is None:
+            AssetManager.music = MusicPlayer(sound_settings, self.openAsset)
+
+    def stopLoader(self) -> None:
+        '''
+        Shut down the shared loader. Run once at shutdown; an AssetManager made after
+        that gets a fresh one.
+        '''
+        if AssetManager.loader is not None:
+            AssetManager.loader.shutdown()
+            AssetManager.loader = None
+
+    def assetExists(self, asset_path: str) -> bool:
+        '''
+        Given a path relative to the asset folder, like 'images/logo.png', return if it
+        exists. Answered from the manifest when we have one.
+        '''
+        if self.pack is not None and asset_path in self.pack:
+            return True
+        if asset_path in self.manifest:
+            return True
+        return os.path.exists(f"{self.asset_prefix}/{asset_path}")
+
+    def assetSource(self, asset_path: str):
+        '''
+        Given a path relative to the asset folder, return where the loader should read it
+        from. A (pack path, asset path) tuple if it's packed, or the file path otherwise.
+        '''
+        if self.pack is not None and asset_path in self.pack:
+            return (self.pack.path, asset_path)
+        return f"{self.asset_prefix}/{asset_path}"
+
+    def sourceKey(self, asset_path: str) -> str:
+        '''
+        Given a path relative to the asset folder, return a key that changes whenever the
+        source file does. The manifest hash if the manifest is up to date for that file,
+        otherwise its size and mtime.
+        '''
+        if self.pack is not None and asset_path in self.pack:
+            offset, size = self.pack.entries[asset_path]
+            return f"{self.pack.stamp:x}-{offset:x}-{size:x}"
+
+        stat = os.stat(f"{self.asset_prefix}/{asset_path}")
+        entry = self.manifest.get(asset_path)
+        if entry is not None and entry['size'] == stat.st_size and self.manifest.mtime(asset_path) == stat.st_mtime_ns:
+            return entry['hash']
+        return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+    def loadCachedImage(self, asset_path: str) -> Surface:
+        '''
+        Given a path relative to the asset folder, return its decoded pixels from the
+        pixel cache, or None if they aren't there.
+        '''
+        if self.pixel_cache is None:
+            return None
+        try:
+            return self.pixel_cache.load(asset_path, self.sourceKey(asset_path))
+        except OSError:
+            return None
+
+    def storeCachedImage(self, asset_path: str, surface: Surface) -> None:
+        '''
+        Save a freshly decoded and converted image to the pixel cache.
+        '''
+        if self.pixel_cache is None:
+            return
+        try:
+            self.pixel_cache.store(asset_path, self.sourceKey(asset_path), surface)
+        except OSError:
+            pass
+
+    def openAsset(self, asset_path: str):
+        '''
+        Given a path relative to the asset folder, return something pygame can load it
+        from. A zero-copy file object into the pack if it's packed, or the file path otherwise.
+        '''
+        if self.pack is not None and asset_path in self.pack:
+            return self.pack.open(asset_path)
+        return f"{self.asset_prefix}/{asset_path}"
+
+    def readAsset(self, asset_path: str) -> bytes:
+        '''
+        Given a path relative to the asset folder, return its contents.
+        '''
+        if self.pack is not None and asset_path in self.pack:
+            return self.pack.view(asset_path).tobytes()
+        with open(f"{self.asset_prefix}/{asset_path}", 'rb') as file:
+            return file.read()
+
+    def startAssetCheck(self) -> None:
+        '''
+        Start checking the asset folder against the manifest in the background. Only
+        files whose size or mtime changed get re-hashed.
+        '''
+        if self.pack is not None:
+            self.logger.writeLogEntry('Running from an asset pack, skipping file check.', LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+            return
+
+        if not self.manifest.loaded:
+            self.logger.writeLogEntry('No asset manifest, skipping file check. Build one with `python -m engine.assettool manifest`.', LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+            return
+
+        executor = ThreadPoolExecutor(1, thread_name_prefix='AssetCheck')
+        started = time.perf_counter()
+        self.asset_check = executor.submit(lambda: (self.manifest.verify(), time.perf_counter()-started))
+        executor.shutdown(wait=False)
+
+    def finishAssetCheck(self) -> bool:
+        '''
+        Wait for the asset check and log what it found.
+
+        Returns: True if every file checked out.
+        '''
+        if self.asset_check is None:
+            return True
+
+        problems, taken = self.asset_check.result()
+        self.asset_check = None
+        for asset_path, problem in problems.items():
+            self.logger.writeLogEntry(f'Asset {asset_path} failed the file check: {problem}.', LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+        self.logger.writeLogEntry(f'Checked {len(self.manifest.files)} assets in {taken*1000:.0f}ms, {len(problems)} problems.', LogConstants.STATUS_OK_GREEN if not problems else LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+        return not problems
+
+    @classmethod
+    def surfaceBytes(self, surface: Surface) -> int:
+        '''
+        Given a surface, return how much memory its pixels take up.
+        '''
+        return surface.get_width()*surface.get_height()*surface.get_bytesize()
+
+    @classmethod
+    def soundBytes(self, sound: mixer.Sound) -> int:
+        '''
+        Given a decoded sound, return how much memory its samples take up.
+        '''
+        frequency, size, channels = mixer.get_init()
+        return int(sound.get_length()*frequency)*(abs(size)//8)*channels
+
+    @classmethod
+    def convertSurface(self, surface: Surface) -> Surface:
+        '''
+        Given a surface, convert it to the display's pixel format so it blits fast.
+        Keeps per-pixel alpha if it has any. Does nothing until the display is up.
+        '''
+        if display.get_surface() is None:
+            return surface
+        if surface.get_flags() & SRCALPHA:
+            return surface.convert_alpha()
+        return surface.convert()
+
     def loadImage(self, asset_name: str) -> Surface:
         '''
-        Load an image in Texture form.
+        Load an image in Texture form. Images are converted to the display format and
+        cached, so loading the same image again is free.
+
+        Cached surfaces are shared, so copy them before changing their pixels. Images in
+        the atlas come back as a view of their spot on the page.
 
         Given:
             - asset_name: name of the asset, including extension.
-        
+
         Returns: Asset as a texture.
         '''
-        asset_path = f"{self.asset_prefix}/images/{asset_name}"
+        sprite = self.atlas.get(asset_name)
+        if sprite is not None:
+            return sprite.surface()
 
-        if os.path.exists(asset_path):
-            self.logger.writeLogEntry(f'Loading asset: {asset_name}', status=LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
-            return image.load(asset_path)
+        surface = self.image_cache.get(asset_name)
+        if surface is not None:
+            return surface
+
+        # Already decoding in the background, so just wait for it.
+        if self.loader.isPending('image', asset_name):
+            return self.collectAsset('image', asset_name, True)
+
+        asset_path = f"images/{asset_name}"
+
+        if self.assetExists(asset_path):
+            self.logger.writeLogFormat('Loading asset: %s', asset_name, status=LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+            surface = self.loadCachedImage(asset_path)
+            if surface is None:
+                try:
+                    surface = self.convertSurface(image.load(self.openAsset(asset_path), asset_name))
+                except (OSError, error) as e:
+                    # Listed in the manifest, but gone from disk.
+                    self.logger.writeLogEntry(f'Couldn\'t load {asset_name}, is the asset manifest out of date? {e}', status=LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+                    return None
+                self.storeCachedImage(asset_path, surface)
+            self.image_cache.put(asset_name, surface)
+            return surface
 
         else:
             self.logger.writeLogEntry(f'Couldn\'t find {asset_name}!', status=LogConstants.STATUS_FAIL, tool="ASSET_MGR")
 
-    def playSfx(self, asset_name: str) -> Surface:
+    def convertCachedImages(self) -> None:
+        '''
+        Convert everything loaded before the display was up. Run after Screen.initScreen.
+        '''
+        for asset_name, surface in self.image_cache.items():
+            self.image_cache.put(asset_name, self.convertSurface(surface))
+        self.atlas.convert(self.convertSurface)
+
+    def loadAtlas(self) -> bool:
+        '''
+        Load the prebuilt atlas from the asset folder, if there is one. Build it with
+        `python -m engine.assettool atlas`.
+
+        Returns: True if it got loaded.
+        '''
+        layout_path = f"atlas/{TextureAtlas.filename}"
+        if not self.assetExists(layout_path):
+            return False
+
+        try:
+            data = self.readAsset(layout_path)
+            pages = []
+            for page_name in json.loads(data)['pages']:
+                page_path = f"atlas/{page_name}"
+                page = self.loadCachedImage(page_path)
+                if page is None:
+                    page = self.convertSurface(image.load(self.openAsset(page_path), page_name))
+                    self.storeCachedImage(page_path, page)
+                pages.append(page)
+            self.atlas.loadLayout(data, pages)
+        except (OSError, ValueError, KeyError, error) as e:
+            self.logger.writeLogEntry(f'Couldn\'t load the texture atlas! {e}', LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+            return False
+
+        self.logger.writeLogEntry(f'Loaded texture atlas, {len(self.atlas)} images on {len(pages)} pages.', LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+        return True
+
+    def buildAtlas(self, asset_names: list) -> None:
         '''
-        Load a sound in sound form.
+        Pack images into the atlas at runtime. The loose copies get dropped from the image
+        cache, since the atlas has them now and loadImage hands out views of the atlas
+        instead. Anything too big for a page stays loose.
+
+        Given:
+            - asset_names: names of the assets, including extension.
+        '''
+        images = {}
+        for asset_name in asset_names:
+            if asset_name not in self.atlas:
+                surface = self.loadImage(asset_name)
+                if surface is not None:
+                    images[asset_name] = surface
+        if not images:
+            return
+
+        skipped = self.atlas.pack(images, self.convertSurface)
+        for asset_name in images:
+            if asset_name not in skipped:
+                self.image_cache.remove(asset_name)
+        self.logger.writeLogEntry(f'Packed {len(images)-len(skipped)} images into the texture atlas, {len(skipped)} too big.', LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+
+    def getSprite(self, asset_name: str) -> AtlasSprite:
+        '''
+        Get a sprite handle for an image, for drawing with a SpriteBatch. Comes out of the
+        atlas if it's packed, otherwise it covers the whole loaded image.
 
         Given:
             - asset_name: name of the asset, including extension.
-        
-        Returns: Nothing.
+
+        Returns: The sprite.
         '''
-        asset_path = f"{self.asset_prefix}/sfx/{asset_name}"
-        sound_settings = self.config.get_dict('sound')
-        if sound_settings == None:
-            raise Exception("Sound settings in JSON are missing!")
+        sprite = self.atlas.get(asset_name)
+        if sprite is not None:
+            return sprite
+
+        surface = self.loadImage(asset_name)
+        if surface is None:
+            return None
+        return AtlasSprite(asset_name, surface, surface.get_rect())
+
+    def setResolution(self, resolution: tuple, design_resolution: str = '1920x1080') -> None:
+        '''
+        Work out how much images need scaling for the real resolution. Keeps the aspect
+        ratio, so it's the smaller of the two axes. Run after Screen.initScreen.
+
+        Given:
+            - resolution: (width, height) the screen ended up at.
+            - design_resolution: 'WIDTHxHEIGHT' the images were drawn for.
+        '''
+        try:
+            design_width, design_height = [int(side) for side in design_resolution.split('x')]
+        except ValueError:
+            design_width, design_height = 1920, 1080
+
+        AssetManager.scale_factor = min(resolution[0]/design_width, resolution[1]/design_height)
+        self.logger.writeLogEntry(f'Scaling images by {self.scale_factor:.3f} for {resolution[0]}x{resolution[1]}.', LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+
+    def scaleValue(self, value: float) -> int:
+        '''
+        Given a length or position at the design resolution, return it at the real one.
+        '''
+        return round(value*self.scale_factor)
+
+    def imageSize(self, asset_name: str) -> tuple:
+        '''
+        Given an image name, return its size. Comes from the manifest if it's there, so
+        the image doesn't have to be decoded to find out.
+        '''
+        entry = self.manifest.get(f"images/{asset_name}")
+        if entry is not None and 'width' in entry:
+            return (entry['width'], entry['height'])
+        surface = self.loadImage(asset_name)
+        return surface.get_size() if surface is not None else (0, 0)
+
+    def loadScaledImage(self, asset_name: str, size: tuple = None) -> Surface:
+        '''
+        Load an image scaled for the real resolution. The scaled copy is made once with
+        smoothscale, then kept in the image cache and the pixel cache, so only the first
+        boot at a new resolution pays for it. Never scale images per frame, use this.
+
+        Given:
+            - asset_name: name of the asset, including extension.
+            - size: (width, height) to scale to. Defaults to its size times the scale factor.
+
+        Returns: The scaled image.
+        '''
+        if size is None:
+            width, height = self.imageSize(asset_name)
+            size = (max(1, self.scaleValue(width)), max(1, self.scaleValue(height)))
+            if size == (width, height):
+                return self.loadImage(asset_name)
+
+        variant_name = f"{asset_name}@{size[0]}x{size[1]}"
+        surface = self.image_cache.get(variant_name)
+        if surface is not None:
+            return surface
+
+        asset_path = f"images/{asset_name}"
+        variant_path = f"images/{variant_name}"
+        if self.pixel_cache is not None and self.assetExists(asset_path):
+            try:
+                surface = self.pixel_cache.load(variant_path, self.sourceKey(asset_path))
+            except OSError:
+                surface = None
+
+        if surface is None:
+            source = self.loadImage(asset_name)
+            if source is None:
+                return None
+            if source.get_size() == size:
+                return source
 
-        if os.path.exists(asset_path):
-            self.logger.writeLogEntry(f'Loading asset: {asset_name}', status=LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
-            sound = mixer.Sound(asset_path)
-            sound.set_volume(sound_settings.get('sfx_volume', 1.0)-0.4)
-            sound.play()
+            self.logger.writeLogFormat('Scaling asset: %s to %dx%d', asset_name, size[0], size[1], status=LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+            # smoothscale only takes 24 and 32 bit surfaces.
+            if source.get_bitsize() not in [24, 32]:
+                source = image.frombytes(image.tobytes(source, 'RGBA'), source.get_size(), 'RGBA')
+            surface = self.convertSurface(transform.smoothscale(source, size))
+            if self.pixel_cache is not None:
+                try:
+                    self.pixel_cache.store(variant_path, self.sourceKey(asset_path), surface)
+                except OSError:
+                    pass
+
+        self.image_cache.put(variant_name, surface)
+        return surface
+
+    def logCacheStats(self) -> None:
+        '''
+        Write the image, pixel and text cache stats to the log.
+        '''
+        stats = self.image_cache.stats()
+        self.logger.writeLogEntry(f"Image cache: {stats['entries']} images, {stats['size']/1048576:.1f}/{stats['budget']/1048576:.0f} MB, {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions.", LogConstants.STATUS_OK_CYAN, tool="ASSET_MGR")
+        if self.pixel_cache is not None:
+            self.logger.writeLogEntry(f"Pixel cache: {self.pixel_cache.hits} hits, {self.pixel_cache.misses} misses.", LogConstants.STATUS_OK_CYAN, tool="ASSET_MGR")
+        stats = self.text.texts.stats()
+        self.logger.writeLogEntry(f"Text cache: {len(self.text.fonts)} fonts, {stats['entries']} strings, {stats['size']/1048576:.1f}/{stats['budget']/1048576:.0f} MB, {stats['hits']} hits, {stats['misses']} misses.", LogConstants.STATUS_OK_CYAN, tool="ASSET_MGR")
+
+    def renderText(self, font_name: str, size: int, text: str, color: tuple, antialias: bool = True) -> Surface:
+        '''
+        Render text with a font from the fonts folder. Fonts and rendered text are both
+        cached, so rendering the same text every frame costs nothing after the first.
+
+        Given:
+            - font_name: name of the font asset, including extension.
+            - size: font size, in pixels.
+            - text, color: what to render.
+
+        Returns: The rendered text. Shared, so copy it before drawing on it.
+        '''
+        return self.text.render(self.assetSource(f"fonts/{font_name}"), size, text, color, antialias)
+
+    def drawText(self, target: Surface, font_name: str, size: int, text: str, color: tuple, pos: tuple, align: int = 0):
+        '''
+        Draw text with a font from the fonts folder. See renderText.
+
+        Given:
+            - align: what pos is. 0 for the top left, 1 for the center, 2 for the top right.
+
+        Returns: The rect it was drawn at.
+        '''
+        return self.text.draw(target, self.assetSource(f"fonts/{font_name}"), size, text, color, pos, align)
+
+    def loadSound(self, asset_name: str) -> mixer.Sound:
+        '''
+        Decode a sound and keep it in the sound bank, so playing it later is free.
+
+        Given:
+            - asset_name: name of the asset, including extension.
+
+        Returns: The decoded sound.
+        '''
+        sound = self.sound_bank.get(asset_name)
+        if sound is not None:
+            return sound
+
+        if self.loader.isPending('sound', asset_name):
+            return self.collectAsset('sound', asset_name, True)
+
+        asset_path = f"sfx/{asset_name}"
+
+        if self.assetExists(asset_path):
+            self.logger.writeLogFormat('Loading asset: %s', asset_name, status=LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+            try:
+                sound = mixer.Sound(file=self.openAsset(asset_path))
+            except (OSError, error) as e:
+                self.logger.writeLogEntry(f'Couldn\'t load {asset_name}, is the asset manifest out of date? {e}', status=LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+                return None
+            self.sound_bank.put(asset_name, sound)
+            return sound
 
         else:
-            self.logger.writeLogEntry(f'Couldn\'t find {asset_name}!', status=LogConstants.STATUS_FAIL, tool="ASSET_MGR")
\ No newline at end of file
+            self.logger.writeLogEntry(f'Couldn\'t find {asset_name}!', status=LogConstants.STATUS_FAIL, tool="ASSET_MGR")
+
+    def playSfx(self, asset_name: str, category: str = 'sfx', priority: int = 0, volume: float = 0.6) -> mixer.Channel:
+        '''
+        Play a sound through the channel pool. Sounds should be preloaded with
+        loadSound, anything that isn't gets decoded on the spot.
+
+        Given:
+            - asset_name: name of the asset, including extension.
+            - category: volume category, one of sfx, music, attract or system.
+            - priority: higher priorities steal voices from lower ones when the pool is full.
+            - volume: volume scale on top of the category volume. Leaves some headroom by default.
+
+        Returns: The channel it's playing on, or None if it got dropped.
+        '''
+        sound = self.sound_bank.get(asset_name)
+        if sound is None:
+            sound = self.loadSound(asset_name)
+            if sound is None:
+                return None
+
+        if self.channel_pool is None:
+            self.initSound()
+
+        return self.channel_pool.play(sound, category, priority, volume)
+
+    def musicTrack(self, asset_name: str, category: str, loops: int) -> tuple:
+        '''
+        Given a music asset, return a track for the music player. Tracks get streamed from
+        the file, or straight out of the pack, never decoded up front.
+        '''
+        asset_path = f"music/{asset_name}"
+        if not self.assetExists(asset_path):
+            self.logger.writeLogEntry(f'Couldn\'t find {asset_name}!', status=LogConstants.STATUS_FAIL, tool="ASSET_MGR")
+        return (asset_name, asset_path, category, loops)
+
+    def playMusic(self, asset_name: str, category: str = 'music', fade: float = 0.0, loops: int = 0) -> None:
+        '''
+        Stream a music track now, replacing whatever's playing. The rest of the playlist
+        plays after it.
+
+        Given:
+            - asset_name: name of the asset in the music folder, including extension.
+            - category: volume category, music or attract.
+            - fade: crossfade time in seconds, 0 to cut straight over.
+            - loops: how many extra times to play it, -1 for forever.
+        '''
+        if self.music is None:
+            self.initSound()
+
+        self.logger.writeLogFormat('Playing music: %s', asset_name, status=LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+        self.music.play(self.musicTrack(asset_name, category, loops), fade)
+
+    def queueMusic(self, asset_name: str, category: str = 'music', loops: int = 0) -> None:
+        '''
+        Add a music track to the end of the playlist. It starts with no gap when the one
+        before it ends, or right away if nothing's playing.
+
+        Given:
+            - asset_name: name of the asset in the music folder, including extension.
+            - category: volume category, music or attract.
+            - loops: how many extra times to play it, -1 for forever.
+        '''
+        if self.music is None:
+            self.initSound()
+        self.music.enqueue(self.musicTrack(asset_name, category, loops))
+
+    def stopMusic(self, fade: float = 0.0) -> None:
+        '''
+        Stop the music and clear the playlist, fading out over fade seconds.
+        '''
+        if self.music is not None:
+            self.music.stop(fade)
+
+    def updateMusic(self) -> None:
+        '''
+        Step music fades. Run once a frame.
+        '''
+        if self.music is not None:
+            self.music.update()
+
+    def queueImage(self, asset_name: str) -> None:
+        '''
+        Start decoding an image in the background. Pick it up with pollAssets, or
+        loadImage to wait for it.
+
+        Given:
+            - asset_name: name of the asset, including extension.
+        '''
+        if asset_name in self.image_cache:
+            return
+
+        # Warm boot, the pixels are already decoded on disk.
+        surface = self.loadCachedImage(f"images/{asset_name}") if self.assetExists(f"images/{asset_name}") else None
+        if surface is not None:
+            self.logger.writeLogFormat('Loading asset: %s (cached pixels)', asset_name, status=LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+            self.image_cache.put(asset_name, surface)
+            return
+
+        self.loader.queue('image', asset_name, self.assetSource(f"images/{asset_name}"))
+
+    def queueSound(self, asset_name: str) -> None:
+        '''
+        Start decoding a sound in the background. Pick it up with pollAssets, or
+        loadSound to wait for it.
+
+        Given:
+            - asset_name: name of the asset, including extension.
+        '''
+        if asset_name not in self.sound_bank:
+            self.loader.queue('sound', asset_name, self.assetSource(f"sfx/{asset_name}"))
+
+    def finishAsset(self, kind: str, asset_name: str, result: tuple):
+        '''
+        Turn a decoded result from the loader into a surface or sound, and cache it.
+        Only run this on the main thread.
+        '''
+        self.logger.writeLogFormat('Loading asset: %s', asset_name, status=LogConstants.STATUS_OK_BLUE, tool="ASSET_MGR")
+
+        if result[0] == 'surface':
+            asset = self.convertSurface(result[1])
+        elif result[0] == 'raw':
+            asset = self.convertSurface(image.frombuffer(result[1], result[2], result[3]))
+        elif result[0] == 'file':
+            asset = mixer.Sound(file=io.BytesIO(result[1]))
+        else:
+            asset = result[1]
+
+        if kind == 'image':
+            self.storeCachedImage(f"images/{asset_name}", asset)
+            self.image_cache.put(asset_name, asset)
+        else:
+            self.sound_bank.put(asset_name, asset)
+        return asset
+
+    def collectAsset(self, kind: str, asset_name: str, wait: bool = False):
+        '''
+        Given a queued asset, finish it if it's decoded. If wait is set, block until it is.
+
+        Returns: The asset, or None if it isn't ready yet.
+        '''
+        try:
+            result = self.loader.take(kind, asset_name, wait)
+        except FileNotFoundError as e:
+            # Listed in the manifest, but gone from disk.
+            self.logger.writeLogEntry(f'Couldn\'t load {asset_name}, is the asset manifest out of date? {e}', status=LogConstants.STATUS_WARNING, tool="ASSET_MGR")
+            return None
+        except (OSError, error) as e:
+            self.logger.writeLogEntry(f'Couldn\'t load {asset_name}! {e}', status=LogConstants.STATUS_FAIL, tool="ASSET_MGR")
+            return None
+
+        if result is None:
+            return None
+        return self.finishAsset(kind, asset_name, result)
+
+    def pollAssets(self, budget: float = 0.004) -> list:
+        '''
+        Finish whatever the loader has decoded, spending at most budget seconds so the
+        frame keeps its rate. Run once a frame while loading.
+
+        Returns: List of (asset_name, asset) that got finished.
+        '''
+        out = []
+        for kind, asset_name in self.loader.poll(budget):
+            out.append((asset_name, self.collectAsset(kind, asset_name)))
+        return out
+
+    def loadProgress(self) -> float:
+        '''
+        Return how much of the queued loading is done, from 0.0 to 1.0.
+        '''
+        return self.loader.progress()
@@ -0,0 +1,213 @@
+from pygame import BLEND_RGBA_MAX, Rect, Surface, SRCALPHA
+import json
+
+class AtlasSprite:
+    '''
+    Handle to one image inside an atlas page. Blit it with
+    `target.blit(sprite.page, dest, sprite.rect)`, or hand it to a SpriteBatch.
+    '''
+    __slots__ = ('name', 'page', 'rect', 'view')
+
+    def __init__(self, name: str, page: Surface, rect: Rect) -> None:
+        self.name = name
+        self.page = page
+        self.rect = rect
+        self.view = None
+
+    def surface(self) -> Surface:
+        '''
+        Return the image as a surface of its own. It's a subsurface, sharing the page's
+        pixels, so copy it before changing it.
+        '''
+        if self.view is None or self.view.get_parent() is not self.page:
+            self.view = self.page.subsurface(self.rect)
+        return self.view
+
+    def get_size(self) -> tuple:
+        return self.rect.size
+
+    def get_width(self) -> int:
+        return self.rect.width
+
+    def get_height(self) -> int:
+        return self.rect.height
+
+class TextureAtlas:
+    '''
+    Packs lots of small images into a few big page surfaces, so they sit together in
+    memory and can be drawn in one Surface.blits call. Images get laid out on shelves,
+    tallest first, and a new page gets started when one fills up.
+
+    Atlases can be packed at runtime with pack, or built ahead of time and saved as
+    page images plus a layout file:
+
+        {"version": 1, "pages": ["page_0.png", ...], "sprites": {name: [page, x, y, w, h]}}
+    '''
+    filename = "atlas.json"
+    version = 1
+
+    def __init__(self, page_size: int = 2048, padding: int = 1) -> None:
+        self.page_size = page_size
+        self.padding = padding
+        self.pages = []
+        self.sprites = {}
+
+    def __contains__(self, asset_name: str) -> bool:
+        return asset_name in self.sprites
+
+    def __len__(self) -> int:
+        return len(self.sprites)
+
+    def get(self, asset_name: str) -> AtlasSprite:
+        return self.sprites.get(asset_name)
+
+    @classmethod
+    def layout(self, sizes: dict, page_size: int, padding: int) -> tuple:
+        '''
+        Given a dict of name to (width, height), work out where everything goes.
+
+        Returns: (placements, page_heights, skipped), where placements is a dict of name to
+        (page, x, y), page_heights is how much of each page got used, and skipped lists
+        anything too big to fit on a page.
+        '''
+        placements = {}
+        page_heights = []
+        skipped = []
+
+        page = -1
+        x = y = shelf_height = 0
+        for name, (width, height) in sorted(sizes.items(), key=lambda item: (-item[1][1], -item[1][0], item[0])):
+            if width > page_size or height > page_size:
+                skipped.append(name)
+                continue
+
+            # Next shelf, then next page, if it doesn't fit where we are.
+            if page >= 0 and x+width > page_size:
+                x = 0
+                y += shelf_height+padding
+                shelf_height = 0
+            if page < 0 or y+height > page_size:
+                page += 1
+                page_heights.append(0)
+                x = y = shelf_height = 0
+
+            placements[name] = (page, x, y)
+            x += width+padding
+            shelf_height = max(shelf_height, height)
+            page_heights[page] = max(page_heights[page], y+height)
+
+        return placements, page_heights, skipped
+
+    def pack(self, images: dict, convert = None) -> list:
+        '''
+        Given a dict of name to surface, copy them all onto new pages. Pages are only as
+        tall as they need to be. Images already in the atlas get replaced. If convert is
+        given, like AssetManager.convertSurface, the new pages get run through it.
+
+        Returns: The names that were too big to pack.
+        '''
+        sizes = {name: surface.get_size() for name, surface in images.items()}
+
+        # Max reads an alpha set with set_alpha on a surface without per-pixel alpha as 0,
+        # so it'd pack invisible. That alpha's for drawing anyway, so pack those opaque.
+        images = dict(images)
+        for name, surface in images.items():
+            if not surface.get_masks()[3] and surface.get_alpha() is not None:
+                images[name] = surface.copy()
+                images[name].set_alpha(None)
+
+        placements, page_heights, skipped = self.layout(sizes, self.page_size, self.padding)
+
+        first_page = len(self.pages)
+        for page, page_height in enumerate(page_heights):
+            surface = Surface((self.page_size, page_height), SRCALPHA)
+            surface.fill((0, 0, 0, 0))
+            # Max onto a clear page copies the pixels exactly, where a normal blit would blend them.
+            surface.blits([(images[name], (x, y), None, BLEND_RGBA_MAX) for name, (index, x, y) in placements.items() if index == page], doreturn=False)
+            self.pages.append(convert(surface) if convert is not None else surface)
+
+        for name, (page, x, y) in placements.items():
+            self.sprites[name] = AtlasSprite(name, self.pages[first_page+page], Rect((x, y), sizes[name]))
+        return skipped
+
+    def convert(self, convert) -> None:
+        '''
+        Run every page through a surface converter, like AssetManager.convertSurface,
+        and point the sprites at the converted pages.
+        '''
+        converted = {id(page): convert(page) for page in self.pages}
+        self.pages = [converted[id(page)] for page in self.pages]
+        for sprite in self.sprites.values():
+            sprite.page = converted[id(sprite.page)]
+
+    def save(self, folder: str) -> list:
+        '''
+        Write the pages and the layout file to a folder.
+
+        Returns: The file names written.
+        '''
+        from pygame import image
+
+        page_names = [f"page_{index}.png" for index in range(len(self.pages))]
+        for page, page_name in zip(self.pages, page_names):
+            image.save(page, f"{folder}/{page_name}")
+
+        page_index = {id(page): index for index, page in enumerate(self.pages)}
+        data = {
+            'version': self.version,
+            'pages': page_names,
+            'sprites': {name: [page_index[id(sprite.page)], *sprite.rect] for name, sprite in sorted(self.sprites.items())}
+        }
+        with open(f"{folder}/{self.filename}", 'w') as file:
+            file.write(json.dumps(data, indent=4))
+        return page_names+[self.filename]
+
+    def loadLayout(self, data: bytes, pages: list) -> None:
+        '''
+        Given a layout file's contents and its page surfaces (in the order the layout
+        lists them), add the saved sprites to this atlas.
+        '''
+        layout = json.loads(data)
+        if layout.get('version') != self.version:
+            raise ValueError(f"Atlas layout isn't version {self.version}!")
+
+        first_page = len(self.pages)
+        self.pages.extend(pages)
+        for name, (page, x, y, width, height) in layout['sprites'].items():
+            self.sprites[name] = AtlasSprite(name, self.pages[first_page+page], Rect(x, y, width, height))
+
+class SpriteBatch:
+    '''
+    Collects sprite draws for a frame and submits them in one Surface.blits call, so
+    drawing hundreds of sprites costs one trip into pygame instead of hundreds.
+
+    Draws happen in the order they were added, so add back to front.
+    '''
+
+    def __init__(self, target: Surface) -> None:
+        self.target = target
+        self.draws = []
+
+    def __len__(self) -> int:
+        return len(self.draws)
+
+    def draw(self, sprite: AtlasSprite, dest) -> None:
+        '''
+        Queue a sprite to be drawn with its top left at dest.
+        '''
+        self.draws.append((sprite.page, dest, sprite.rect))
+
+    def drawMany(self, sprite: AtlasSprite, dests) -> None:
+        '''
+        Queue the same sprite at every position in dests.
+        '''
+        page, rect = sprite.page, sprite.rect
+        self.draws.extend((page, dest, rect) for dest in dests)
+
+    def flush(self) -> None:
+        '''
+        Draw everything queued, then start over.
+        '''
+        if self.draws:
+            self.target.blits(self.draws, doreturn=False)
+            self.draws.clear()
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+class LRUCache:
+    '''
+    Least-recently-used cache with a size budget. Every entry has a cost (bytes, or
+    just 1 to cap the entry count), and the oldest entries get evicted once the total
+    goes over the budget.
+
+    Keeps hit, miss and eviction stats.
+    '''
+
+    def __init__(self, budget: int, sizeof = None) -> None:
+        self.budget = budget
+        self.sizeof = sizeof if sizeof is not None else (lambda value: 1)
+        self.entries = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries
+
+    def get(self, key, default = None):
+        '''
+        Given a key, return the cached value and mark it as recently used.
+        '''
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value) -> None:
+        '''
+        Cache a value, evicting old entries until we're back under budget. The newest
+        entry is always kept, even if it's bigger than the whole budget.
+        '''
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+
+        cost = self.sizeof(value)
+        self.entries[key] = (value, cost)
+        self.size += cost
+
+        while self.size > self.budget and len(self.entries) > 1:
+            old_key, (old_value, old_cost) = self.entries.popitem(last=False)
+            self.size -= old_cost
+            self.evictions += 1
+
+    def remove(self, key) -> None:
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+    def items(self) -> list:
+        return [(key, entry[0]) for key, entry in self.entries.items()]
+
+    def stats(self) -> dict:
+        '''
+        Return the cache stats.
+        '''
+        return {
+            'entries': len(self.entries),
+            'size': self.size,
+            'budget': self.budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 class LogConstants:
     '''
     Constant logger states and codes.
@@ -22,6 +24,17 @@ class LogConstants:
     STATUS_BOLD = 6
     STATUS_UNDERLINE = 7
 
+    STATUS_PREFIX = {
+        STATUS_FAIL: 'F: ',
+        STATUS_WARNING: 'W: ',
+        STATUS_HEADER: '',
+        STATUS_OK_BLUE: 'DBG: ',
+        STATUS_OK_CYAN: '',
+        STATUS_OK_GREEN: '',
+        STATUS_BOLD: '',
+        STATUS_UNDERLINE: ''
+    }
+
     TEXT_HEADER = '\033[95m'
     TEXT_OK_BLUE = '\033[94m'
     TEXT_OK_CYAN = '\033[96m'
@@ -33,6 +46,22 @@ class LogConstants:
     TEXT_UNDERLINE = '\033[4m'
 
     LOGFILE = "./log.txt"
+    TIME_FORMAT = "%m/%d/%Y %H:%M:%S"
+    STRUCTURED_LOGFILE = "./log.jsonl"
+    STRUCTURED_INDEX_BLOCK = 256 # Records per block in the structured log's sidecar index.
+
+    ROTATE_MAX_SIZE_MB = 8 # Rotate once the logfile gets this big. 0 to disable.
+    ROTATE_MAX_AGE_HOURS = 24 # Rotate once the oldest entry is this old. 0 to disable.
+    ROTATE_GENERATIONS = 14 # How many old logfiles to keep around.
+
+    WRITER_DIRECT = "direct" # Write every entry on the calling thread.
+    WRITER_QUEUE = "queue" # Hand entries to a background writer thread.
+
+    QUEUE_FULL_DROP = "drop" # Throw the entry away if the writer can't keep up.
+    QUEUE_FULL_BLOCK = "block" # Wait for the writer to make room.
+
+    QUEUE_SIZE = 4096 # Max entries waiting on the writer thread.
+    QUEUE_BATCH = 256 # Max entries written in one go.
 
     @classmethod
     def toLoglevel(self, loglevel: str = None) -> int:
@@ -58,6 +87,28 @@ class LogConstants:
             self.LOGLEVEL_ERRORS: self.LOG_ERRORS
         }[loglevel if loglevel != None else 1]
 
+    @classmethod
+    def formatEntry(self, entry: tuple) -> str:
+        '''
+        Given a (timestamp, tool, status, message) entry, return the plain text log line.
+        '''
+        timestamp, tool, status, message = entry
+        current_time = datetime.fromtimestamp(timestamp).strftime(self.TIME_FORMAT)
+        return f"[{current_time} from {tool}] {self.STATUS_PREFIX[status]}{message}"
+
+    @classmethod
+    def isLogged(self, loglevel: int, status_code: int) -> bool:
+        '''
+        Given a loglevel code and a status code, return if an entry with that status gets logged.
+        '''
+        if loglevel == self.LOGLEVEL_DISABLE:
+            return False
+        if status_code == self.STATUS_OK_BLUE and loglevel != self.LOGLEVEL_DEBUG:
+            return False
+        if loglevel == self.LOGLEVEL_ERRORS and status_code < self.STATUS_WARNING:
+            return False
+        return True
+
     @classmethod
     def getColor(self, status_code: int = None) -> str:
         '''
@@ -69,5 +120,7 @@ class LogConstants:
             self.STATUS_OK_CYAN: self.TEXT_OK_CYAN,
             self.STATUS_OK_GREEN: self.TEXT_OK_GREEN,
             self.STATUS_WARNING: self.TEXT_WARNING,
-            self.STATUS_FAIL: self.TEXT_FAIL
+            self.STATUS_FAIL: self.TEXT_FAIL,
+            self.STATUS_BOLD: self.TEXT_BOLD,
+            self.STATUS_UNDERLINE: self.TEXT_UNDERLINE
         }[status_code if status_code != None else self.STATUS_OK_GREEN]
\ No newline at end of file
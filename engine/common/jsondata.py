@@ -18,7 +18,7 @@ class JSONData:
         Load a given JSON file.
         '''
         if os.path.exists(path):
-            self.logger.writeLogEntry(f'Loading JSON: {path}', status=LogConstants.STATUS_OK_BLUE, tool="JSON_MGR")
+            self.logger.writeLogFormat('Loading JSON: %s', path, status=LogConstants.STATUS_OK_BLUE, tool="JSON_MGR")
 
             out = None
             with open(path, 'r') as file:
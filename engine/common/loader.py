@@ -0,0 +1,112 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import os, time
+
+from engine.common.pack import AssetPack
+
+class AssetLoader:
+    '''
+    Background asset loader. File reads and decodes run on a thread pool (or a process
+    pool for heavy decodes), and the results get handed back to the main thread, which
+    is the only place surfaces and sounds get finished.
+
+    Jobs are (kind, asset_name, source), where kind is 'image' or 'sound', and source is
+    either a file path or a (pack path, asset path) tuple for assets inside a pack.
+    '''
+
+    def __init__(self, workers: int = 0, use_processes: bool = False) -> None:
+        workers = workers if workers > 0 else min(8, (os.cpu_count() or 1)+2)
+        self.use_processes = use_processes
+        self.executor = ProcessPoolExecutor(workers) if use_processes else ThreadPoolExecutor(workers, thread_name_prefix='AssetLoader')
+
+        self.pending = {}
+        self.queued = 0
+        self.finished = 0
+
+    @classmethod
+    def openSource(self, source):
+        '''
+        Given a job source, return something pygame can load from.
+        '''
+        if isinstance(source, tuple):
+            return AssetPack.openShared(source[0]).open(source[1])
+        return source
+
+    @classmethod
+    def decodeImage(self, source, raw: bool) -> tuple:
+        '''
+        Decode an image. In a process pool, surfaces can't come back, so the pixels
+        come back as bytes instead.
+        '''
+        from pygame import SRCALPHA, image
+
+        surface = image.load(self.openSource(source), source[1] if isinstance(source, tuple) else source)
+        if not raw:
+            return ('surface', surface)
+
+        pixel_format = 'RGBA' if surface.get_flags() & SRCALPHA else 'RGB'
+        return ('raw', image.tobytes(surface, pixel_format), surface.get_size(), pixel_format)
+
+    @classmethod
+    def decodeSound(self, source, raw: bool) -> tuple:
+        '''
+        Decode a sound. In a process pool, the mixer isn't ours, so just read the file
+        and leave the decode to the main thread.
+        '''
+        if raw:
+            if isinstance(source, tuple):
+                return ('file', self.openSource(source).read())
+            with open(source, 'rb') as file:
+                return ('file', file.read())
+
+        from pygame import mixer
+        return ('sound', mixer.Sound(file=self.openSource(source)))
+
+    def queue(self, kind: str, asset_name: str, source) -> None:
+        '''
+        Queue up a decode. Does nothing if that asset is already on its way.
+        '''
+        if (kind, asset_name) in self.pending:
+            return
+
+        decode = self.decodeImage if kind == 'image' else self.decodeSound
+        self.pending[(kind, asset_name)] = self.executor.submit(decode, source, self.use_processes)
+        self.queued += 1
+
+    def isPending(self, kind: str, asset_name: str) -> bool:
+        return (kind, asset_name) in self.pending
+
+    def take(self, kind: str, asset_name: str, wait: bool = False) -> tuple:
+        '''
+        Given an asset, return its decoded result and forget about the job. Returns None
+        if it isn't done yet and we're not waiting. Decode errors get raised here.
+        '''
+        future: Future = self.pending.get((kind, asset_name))
+        if future is None or (not wait and not future.done()):
+            return None
+
+        del self.pending[(kind, asset_name)]
+        self.finished += 1
+        return future.result()
+
+    def poll(self, budget: float = 0.004):
+        '''
+        Yield (kind, asset_name) for every finished job, stopping once the budget (in
+        seconds) is used up so the frame doesn't stall. Pick each one up with take.
+        '''
+        start = time.perf_counter()
+        for key in [key for key, future in self.pending.items() if future.done()]:
+            yield key
+            if time.perf_counter()-start >= budget:
+                return
+
+    def progress(self) -> float:
+        '''
+        Return how much of everything queued so far is done, from 0.0 to 1.0.
+        '''
+        return self.finished/self.queued if self.queued else 1.0
+
+    def isDone(self) -> bool:
+        return not self.pending
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,68 +1,489 @@
+import atexit, gzip, os, queue, shutil, sys, threading, time
 from datetime import datetime
 from engine.common.constants import LogConstants
+from engine.common.validated import ValidatedDict
+from engine.common.logsink import StructuredLogSink
+
+class LogRotator:
+    '''
+    Shuffles old logfiles down the generation list and gzips them. All of the slow
+    work happens on its own thread so the writer never waits on compression.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self.rotatorLoop, name='LogRotator', daemon=True)
+        self.thread.start()
+
+    def generationPath(self, generation: int, compress: bool) -> str:
+        '''
+        Given a generation number, return the path that generation lives at.
+        '''
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{generation}{ext}{'.gz' if compress else ''}"
+
+    def queueRotation(self, archived_path: str, generations: int, compress: bool) -> None:
+        '''
+        Hand an already-renamed logfile to the worker thread.
+        '''
+        self.jobs.put((archived_path, generations, compress))
+
+    def close(self) -> None:
+        '''
+        Finish any rotations still waiting, then stop the thread.
+        '''
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+
+    def rotate(self, archived_path: str, generations: int, compress: bool) -> None:
+        '''
+        Shift every generation down by one and store the archived log as generation 1.
+        '''
+        # Drop whatever falls off the end.
+        for stale in range(generations, generations+2):
+            for stale_compress in (True, False):
+                if os.path.exists(self.generationPath(stale, stale_compress)):
+                    os.remove(self.generationPath(stale, stale_compress))
+
+        for generation in range(generations-1, 0, -1):
+            for old_compress in (True, False):
+                old_path = self.generationPath(generation, old_compress)
+                if os.path.exists(old_path):
+                    os.replace(old_path, self.generationPath(generation+1, old_compress))
+
+        if generations < 1:
+            os.remove(archived_path)
+        elif compress:
+            with open(archived_path, 'rb') as source, gzip.open(self.generationPath(1, True), 'wb') as dest:
+                shutil.copyfileobj(source, dest)
+            os.remove(archived_path)
+        else:
+            os.replace(archived_path, self.generationPath(1, False))
+
+    def rotatorLoop(self) -> None:
+        '''
+        Main loop of the rotator thread.
+        '''
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+
+            try:
+                self.rotate(*job)
+            except OSError as e:
+                print(f"{LogConstants.TEXT_WARNING}[LogRotator] W: Couldn't rotate {job[0]}: {e}{LogConstants.TEXT_END}")
+
+class LogFile:
+    '''
+    The open logfile. Keeps track of its size and age so it knows when to rotate.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.max_size = LogConstants.ROTATE_MAX_SIZE_MB*1024*1024
+        self.max_age = LogConstants.ROTATE_MAX_AGE_HOURS*3600
+        self.generations = LogConstants.ROTATE_GENERATIONS
+        self.compress = True
+        self.rotator = LogRotator(path)
+        self.open()
+
+    def open(self) -> None:
+        '''
+        Open the logfile in append mode, picking up the size and age of whatever is in it.
+        '''
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+        self.started = time.time()
+
+        # The first entry tells us how old the file is.
+        if self.size:
+            with open(self.path, 'r', encoding='utf-8', errors='replace') as file:
+                first = file.readline()
+            try:
+                self.started = datetime.strptime(first[1:first.index(' from ')], LogConstants.TIME_FORMAT).timestamp()
+            except ValueError:
+                pass
+
+    def setLimits(self, max_size_mb: int, max_age_hours: int, generations: int, compress: bool) -> None:
+        '''
+        Set the rotation limits. Zero for a size or age disables that check.
+        '''
+        self.max_size = max_size_mb*1024*1024
+        self.max_age = max_age_hours*3600
+        self.generations = generations
+        self.compress = compress
+
+    def write(self, text: str) -> bool:
+        '''
+        Append to the logfile, rotating first if we've gone past a limit.
+
+        Returns: True if it rotated.
+        '''
+        rotated = False
+        if (self.max_size and self.size >= self.max_size) or (self.max_age and time.time()-self.started >= self.max_age):
+            self.rotate()
+            rotated = True
+
+        self.file.write(text)
+        self.size += len(text.encode('utf-8'))
+        return rotated
+
+    def rotate(self) -> None:
+        '''
+        Move the current logfile out of the way and start a fresh one. Only the rename
+        happens here, the rest is the rotator's problem.
+        '''
+        self.file.close()
+        archived_path = f"{self.path}.{time.time_ns()}"
+        os.replace(self.path, archived_path)
+        self.rotator.queueRotation(archived_path, self.generations, self.compress)
+        self.open()
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+        self.rotator.close()
+
+class LogWriter:
+    '''
+    Logfile writer. Keeps the logfile open in append mode. When threaded, entries go
+    into a bounded queue that a background thread drains, batching them into single
+    writes. Otherwise they're written straight away on the calling thread.
+
+    Entries are (timestamp, tool, status, message) tuples, they only get formatted
+    once they reach the writer.
+
+    If a write ever fails on the thread, like with a full disk, it gets reported on
+    stderr and the writer falls back to writing directly, so entries aren't lost and
+    nothing waits on a thread that's gone. Direct writes take a lock, since every
+    thread logs.
+    '''
+
+    def __init__(self, file: LogFile, threaded: bool = True, queue_size: int = LogConstants.QUEUE_SIZE, queue_full: str = LogConstants.QUEUE_FULL_DROP, console: bool = True) -> None:
+        self.file = file
+        self.sink: StructuredLogSink = None
+        self.console = console
+        self.threaded = threaded
+        self.queue_full = queue_full
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.reported_drops = 0
+        self.lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self.writerLoop, name='LogWriter', daemon=True)
+        if threaded:
+            self.thread.start()
+
+    def put(self, entry: tuple) -> None:
+        '''
+        Queue up an entry. Never touches the disk when threaded, so this is safe to call every frame.
+        '''
+        if not self.threaded:
+            self.writeSafely([entry])
+            return
+
+        # Never throw away the entry that explains why we're about to die.
+        if self.queue_full == LogConstants.QUEUE_FULL_BLOCK or entry[2] == LogConstants.STATUS_FAIL:
+            if not self.putBlocking(entry):
+                self.writeSafely([entry])
+            return
+
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def putBlocking(self, item) -> bool:
+        '''
+        Queue an item, waiting for room for as long as the writer thread is alive.
+
+        Returns: False if the thread is gone, the item didn't get queued.
+        '''
+        while self.thread.is_alive():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def flush(self) -> None:
+        '''
+        Block until everything queued so far has hit the logfile.
+        '''
+        done = threading.Event()
+        if not self.putBlocking(done):
+            self.guarded(self.flushFiles)
+            return
+        while not done.wait(0.1) and self.thread.is_alive():
+            pass
+
+    def close(self) -> None:
+        '''
+        Flush whatever is left, stop the thread and close the logfile.
+        '''
+        if self.putBlocking(None):
+            self.thread.join()
+        else:
+            self.guarded(self.closeFiles)
+
+    def flushFiles(self) -> None:
+        self.file.flush()
+        if self.sink is not None:
+            self.sink.flush()
+
+    def closeFiles(self) -> None:
+        self.file.close()
+        if self.sink is not None:
+            self.sink.close()
+
+    def writeBatch(self, batch: list) -> None:
+        '''
+        Print a batch of entries to the console, unless it's off, and append them to the logfile.
+        '''
+        # Let the log know if we had to throw stuff away.
+        dropped = self.dropped
+        if dropped != self.reported_drops:
+            batch.append((time.time(), 'LogWriter', LogConstants.STATUS_WARNING, f"Dropped {dropped-self.reported_drops} log entries, queue was full."))
+            self.reported_drops = dropped
+
+        lines = [LogConstants.formatEntry(entry) for entry in batch]
+        if self.console:
+            print('\n'.join(f"{LogConstants.getColor(entry[2])}{line}{LogConstants.TEXT_END}" for entry, line in zip(batch, lines)))
+        rotated = self.file.write(''.join(f"{line}\n" for line in lines))
+
+        sink = self.sink
+        if sink is not None:
+            if rotated:
+                sink.rotate(self.file.generations, self.file.compress)
+            sink.write(batch)
+
+    def guarded(self, action, *args) -> bool:
+        '''
+        Run a write, flush or close under the lock, reporting anything that goes wrong
+        on stderr instead of raising it.
+
+        Returns: False if it failed.
+        '''
+        try:
+            with self.lock:
+                action(*args)
+            return True
+        except Exception as e:
+            print(f"{LogConstants.TEXT_WARNING}[LogWriter] W: Couldn't write to the log: {e!r}{LogConstants.TEXT_END}", file=sys.stderr)
+            return False
+
+    def writeSafely(self, batch: list) -> bool:
+        return self.guarded(self.writeBatch, batch)
+
+    def writerLoop(self) -> None:
+        '''
+        Main loop of the writer thread.
+        '''
+        running = True
+        while running:
+            batch = []
+            waiters = []
+            item = self.queue.get()
+
+            # Grab whatever else is waiting so it all goes out in one write.
+            while True:
+                if item is None:
+                    running = False
+                    break
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+
+                if len(batch) >= LogConstants.QUEUE_BATCH:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            ok = True
+            if batch or (self.dropped != self.reported_drops):
+                ok = self.writeSafely(batch)
+            if ok and (waiters or not running or self.queue.empty()):
+                ok = self.guarded(self.flushFiles)
+
+            for waiter in waiters:
+                waiter.set()
+
+            if not ok and running:
+                # Don't go down with the logs still queued, write them directly from here on.
+                print(f"{LogConstants.TEXT_WARNING}[LogWriter] W: Log writer thread failed, writing directly from now on.{LogConstants.TEXT_END}", file=sys.stderr)
+                self.threaded = False
+                self.drain()
+                return
+
+        self.guarded(self.closeFiles)
+
+    def drain(self) -> None:
+        '''
+        Write out whatever's still queued after falling back to direct writes.
+        '''
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                self.guarded(self.closeFiles)
+                return
+            elif isinstance(item, threading.Event):
+                self.guarded(self.flushFiles)
+                item.set()
+            else:
+                self.writeSafely([item])
 
 class LogManager:
     '''
     Main system logger. Saves log to a logfile, does some other things.
     '''
 
-    def __init__(self, loglevel: str = "enable" ) -> None:
+    def __init__(self, loglevel: str = "enable", writer: str = LogConstants.WRITER_QUEUE, queue_full: str = LogConstants.QUEUE_FULL_DROP, console: bool = True) -> None:
         # Get the log level.
         self.loglevel: int = LogConstants.toLoglevel(loglevel)
 
+        # Work out which statuses make it through once, so dropping an entry is a single list lookup.
+        self.logged = [LogConstants.isLogged(self.loglevel, status) for status in range(LogConstants.STATUS_UNDERLINE+1)]
+
+        # How entries get to the logfile.
+        self.writer_mode = writer
+        self.queue_full = queue_full
+        self.console = console # Off when stdout is for something else, entries still go to the logfile.
+        self.writer: LogWriter = None
+        self.logfile: LogFile = None
+
     def initLogFile(self):
         '''
-        Wipe out the logfile upon loading of the engine. 
+        Open the logfile upon loading of the engine. Old entries are kept, rotation
+        takes care of the file getting too big.
         '''
         # Make sure we want a logfile.
         if self.loglevel:
-            with open(LogConstants.LOGFILE, 'w') as file:
-                file.truncate(0)
+            self.openLogFile()
+
+    def setRotation(self, logging_config: ValidatedDict) -> None:
+        '''
+        Apply the rotation limits from the `logging` section of the config.
+        '''
+        self.openLogFile()
+        if self.logfile is None:
+            return
+
+        self.logfile.setLimits(
+            logging_config.get_int('max_size_mb', LogConstants.ROTATE_MAX_SIZE_MB),
+            logging_config.get_int('max_age_hours', LogConstants.ROTATE_MAX_AGE_HOURS),
+            logging_config.get_int('generations', LogConstants.ROTATE_GENERATIONS),
+            logging_config.get_bool('compress', True)
+        )
+
+    def setStructuredLog(self, enable: bool, path: str = LogConstants.STRUCTURED_LOGFILE) -> None:
+        '''
+        Start (or stop) writing a JSON Lines copy of every entry, with a sidecar index
+        for the log query tool.
+        '''
+        self.openLogFile()
+        if self.writer is None:
+            return
+
+        if enable and self.writer.sink is None:
+            self.writer.sink = StructuredLogSink(path, rotator=LogRotator(path))
+        elif not enable and self.writer.sink is not None:
+            self.flushLogFile()
+            sink = self.writer.sink
+            self.writer.sink = None
+            sink.close()
+
+    def openLogFile(self) -> None:
+        '''
+        Open the logfile in append mode, and start the writer thread if we're using one.
+        '''
+        if self.logfile is not None or not self.loglevel:
+            return
+
+        self.logfile = LogFile(LogConstants.LOGFILE)
+        self.writer = LogWriter(self.logfile, self.writer_mode == LogConstants.WRITER_QUEUE, queue_full=self.queue_full, console=self.console)
+
+        # Make sure nothing is left in the queue when python goes away.
+        atexit.unregister(self.closeLogFile)
+        atexit.register(self.closeLogFile)
+
+    def flushLogFile(self) -> None:
+        '''
+        Make sure everything logged so far is on disk.
+        '''
+        if self.writer is not None:
+            self.writer.flush()
+
+    def closeLogFile(self) -> None:
+        '''
+        Flush and close the logfile. Run on shutdown.
+        '''
+        if self.writer is not None:
+            self.writer.close()
+        self.writer = None
+        self.logfile = None
+
+    def isLogged(self, status: int) -> bool:
+        '''
+        Given a status, return if an entry with that status would be logged. Handy for
+        skipping expensive work that only feeds a log message.
+        '''
+        return self.logged[status]
 
-    def writeLogEntry(self, message: str = None, status: int = LogConstants.STATUS_OK_GREEN, underline: bool = False, bold: bool = False, tool: str = "ENGINE") -> None:
+    def writeLogEntry(self, message = None, status: int = LogConstants.STATUS_OK_GREEN, underline: bool = False, bold: bool = False, tool: str = "ENGINE") -> None:
         '''
         Given a log message, status, and some extra things and write a log message with it.
 
         Writes to the logfile and to the console, with cool colors too!
 
         Appends time and date to every entry as well.
+
+        The message can also be a callable returning the message, which only gets
+        called if the entry is actually logged.
         '''
-        old_log = ''
-        log_msg = '' # Don't add color data to this until AFTER we save to log.
+        # Don't log annoying stuff unless wanted. Check this before doing any work.
+        if not self.logged[status]:
+            return
 
-        log_type = {
-            LogConstants.STATUS_FAIL: 'F: ',
-            LogConstants.STATUS_WARNING: 'W: ',
-            LogConstants.STATUS_HEADER: '',
-            LogConstants.STATUS_OK_BLUE: 'DBG: ',
-            LogConstants.STATUS_OK_CYAN: '',
-            LogConstants.STATUS_OK_GREEN: ''
-        }[status]
+        if callable(message):
+            message = message()
 
-        if self.loglevel:
-            current_time = datetime.now().strftime("%m/%d/%Y %H:%M:%S")
-
-            # Dump old logfile
-            with open(LogConstants.LOGFILE, 'r') as logfile:
-                old_log = logfile.read()
-            
-            # Don't log annoying stuff unless wanted.
-            if status == LogConstants.STATUS_OK_BLUE and self.loglevel != LogConstants.LOGLEVEL_DEBUG:
-                return
-            if self.loglevel == LogConstants.LOGLEVEL_ERRORS and status < LogConstants.STATUS_WARNING:
-                return
+        self.emitLogEntry(message, status, tool)
+
+    def writeLogFormat(self, message: str, *args, status: int = LogConstants.STATUS_OK_GREEN, tool: str = "ENGINE") -> None:
+        '''
+        Same as writeLogEntry, but takes a %-style format string and its args. The
+        message is only formatted if the entry is actually logged.
+
+        Given:
+            - message: format string, like 'Loading asset: %s'.
+            - args: values for the format string.
+        '''
+        if not self.logged[status]:
+            return
+
+        self.emitLogEntry(message % args if args else message, status, tool)
+
+    def emitLogEntry(self, message: str, status: int, tool: str) -> None:
+        '''
+        Write an entry that already passed the loglevel check. Formatting happens in the writer.
+        '''
+        # Update logfile
+        self.openLogFile()
+        self.writer.put((time.time(), tool, status, message))
 
-            log_msg = f"[{current_time} from {tool}] {log_type}{message}"
-            print(f"{LogConstants.getColor(status)}{log_msg}{LogConstants.TEXT_END}")
-            
-            # Update logfile
-            with open(LogConstants.LOGFILE, 'w') as file:
-                old_log += f"{log_msg}\n"
-                file.write(old_log)
-
-            # Kill software if needed.
-            if status == LogConstants.STATUS_FAIL:
-                exit()
-            
-            # We're done!
-            return
\ No newline at end of file
+        # Kill software if needed.
+        if status == LogConstants.STATUS_FAIL:
+            self.closeLogFile()
+            exit()
@@ -0,0 +1,224 @@
+import json, os, time
+
+from engine.common.constants import LogConstants
+
+class LogBlock:
+    '''
+    Summary of a run of records in the structured log. Holds the byte range, the
+    time range and how many records each tool logged with each status.
+    '''
+
+    def __init__(self, offset: int = 0) -> None:
+        self.offset = offset
+        self.length = 0
+        self.records = 0
+        self.first: float = None
+        self.last: float = None
+        self.counts = {}
+
+    def add(self, timestamp: float, tool: str, status: int, length: int) -> None:
+        '''
+        Add a record of the given length in bytes to the block.
+        '''
+        self.length += length
+        self.records += 1
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+
+        tool_counts = self.counts.setdefault(tool, {})
+        tool_counts[status] = tool_counts.get(status, 0) + 1
+
+    def count(self, tools: list = None, statuses: list = None) -> int:
+        '''
+        Given optional tool and status filters, return how many records in the block match.
+        '''
+        total = 0
+        for tool, tool_counts in self.counts.items():
+            if tools and tool not in tools:
+                continue
+            for status, count in tool_counts.items():
+                if statuses and status not in statuses:
+                    continue
+                total += count
+        return total
+
+    def toJson(self) -> str:
+        return json.dumps({
+            'offset': self.offset,
+            'length': self.length,
+            'records': self.records,
+            'first': self.first,
+            'last': self.last,
+            'counts': {tool: {str(status): count for status, count in tool_counts.items()} for tool, tool_counts in self.counts.items()}
+        }, separators=(',', ':'))
+
+    @classmethod
+    def fromJson(self, line: str) -> 'LogBlock':
+        data = json.loads(line)
+        block = LogBlock(data['offset'])
+        block.length = data['length']
+        block.records = data['records']
+        block.first = data['first']
+        block.last = data['last']
+        block.counts = {tool: {int(status): count for status, count in tool_counts.items()} for tool, tool_counts in data['counts'].items()}
+        return block
+
+class StructuredLogSink:
+    '''
+    JSON Lines copy of the log, one record per entry:
+
+        {"t": 1700000000.123, "tool": "ASSET_MGR", "status": 5, "msg": "Couldn't find logo.png!"}
+
+    Every `block_size` records, a LogBlock summary gets appended to a sidecar index
+    (`<path>.idx`), so the log query tool can count or skip whole blocks without
+    reading them. Only full blocks are indexed, the unindexed tail is always small.
+
+    It rotates along with the logfile, so both cover the same stretch of time, with
+    old generations handed to the rotator as `log.1.jsonl.gz` and so on.
+    '''
+
+    def __init__(self, path: str, block_size: int = None, rotator = None) -> None:
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.block_size = block_size if block_size else LogConstants.STRUCTURED_INDEX_BLOCK
+        self.rotator = rotator # A LogRotator for this path. Without one, old logs get deleted.
+
+        self.truncatePartialRecord()
+
+        # Catch the index up with anything written after the last indexed block.
+        blocks = StructuredLogSink.loadIndex(self.index_path)
+        offset = blocks[-1].offset+blocks[-1].length if blocks else 0
+        if offset > (os.path.getsize(path) if os.path.exists(path) else 0):
+            # The log got swapped out from under the index, start it over.
+            blocks = []
+            offset = 0
+
+        # Rewrite what we trust of the index, so a torn last line doesn't stick around.
+        self.index = open(self.index_path, 'w', encoding='utf-8')
+        self.index.write(''.join(f"{block.toJson()}\n" for block in blocks))
+        self.block = LogBlock(offset)
+        for record, length in StructuredLogSink.readRecords(path, offset):
+            if record is None:
+                self.block.length += length
+                continue
+            self.addToBlock(record['t'], record['tool'], record['status'], length)
+
+        self.file = open(path, 'ab')
+
+    def truncatePartialRecord(self) -> None:
+        '''
+        Cut off a record that got half-written when we last went down.
+        '''
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb+') as file:
+            size = file.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                file.seek(max(0, end-4096))
+                chunk = file.read(end-max(0, end-4096))
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    end = max(0, end-4096)+newline+1
+                    break
+                end = max(0, end-4096)
+
+            if end != size:
+                file.truncate(end)
+
+    def addToBlock(self, timestamp: float, tool: str, status: int, length: int) -> None:
+        '''
+        Account for a record, and index the block once it's full.
+        '''
+        self.block.add(timestamp, tool, status, length)
+        if self.block.records >= self.block_size:
+            self.index.write(f"{self.block.toJson()}\n")
+            self.block = LogBlock(self.block.offset+self.block.length)
+
+    def write(self, entries: list) -> None:
+        '''
+        Given a list of (timestamp, tool, status, message) entries, append them as records.
+        '''
+        out = []
+        for timestamp, tool, status, message in entries:
+            line = (json.dumps({'t': round(timestamp, 3), 'tool': tool, 'status': status, 'msg': str(message)}, separators=(',', ':'))+'\n').encode('utf-8')
+            out.append(line)
+            self.addToBlock(timestamp, tool, status, len(line))
+        self.file.write(b''.join(out))
+
+    def rotate(self, generations: int, compress: bool) -> None:
+        '''
+        Move the structured log out of the way and start a fresh one, with a fresh index.
+        Old generations don't keep their index, it only points into the live log.
+        '''
+        self.close(False)
+        os.remove(self.index_path)
+        archived_path = f"{self.path}.{time.time_ns()}"
+        os.replace(self.path, archived_path)
+        if self.rotator is not None:
+            self.rotator.queueRotation(archived_path, generations, compress)
+        else:
+            os.remove(archived_path)
+
+        self.index = open(self.index_path, 'w', encoding='utf-8')
+        self.block = LogBlock(0)
+        self.file = open(self.path, 'ab')
+
+    def flush(self) -> None:
+        # The log goes first so the index never points past the end of it.
+        self.file.flush()
+        self.index.flush()
+
+    def close(self, stop_rotator: bool = True) -> None:
+        self.flush()
+        self.file.close()
+        self.index.close()
+        if stop_rotator and self.rotator is not None:
+            self.rotator.close()
+
+    @classmethod
+    def loadIndex(self, index_path: str) -> list:
+        '''
+        Given an index path, return its blocks. Returns an empty list if there's no index.
+        '''
+        blocks = []
+        if not os.path.exists(index_path):
+            return blocks
+
+        with open(index_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    blocks.append(LogBlock.fromJson(line))
+                except (ValueError, KeyError):
+                    # Half-written line, everything after it gets re-read from the log.
+                    break
+        return blocks
+
+    @classmethod
+    def readRecords(self, path: str, offset: int = 0, length: int = None):
+        '''
+        Given a structured log path, yield (record, length in bytes) for each record
+        from the offset on, stopping after length bytes if given. Lines that aren't
+        valid records come out as (None, length) so offsets still add up.
+        '''
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            remaining = length
+            for line in file:
+                if remaining is not None:
+                    if remaining <= 0:
+                        break
+                    remaining -= len(line)
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield (record, len(line))
@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib, json, os, threading, wave
+
+class AssetManifest:
+    '''
+    Index of every file under the asset folder, with its size, content hash, and image
+    dimensions or audio duration. Lookups are dict hits, so nothing has to touch the
+    filesystem to find out if an asset exists or how big it is.
+
+    mtimes are different on every machine, so they don't go in the manifest, which gets
+    checked in. They go in a sidecar under cache/ instead, as (hash, mtime) per file:
+    the mtime a file had when it last hashed to what the manifest says. Files with a
+    matching mtime don't need hashing again.
+
+    Paths are relative to the asset folder, like 'images/logo.png'.
+    '''
+    filename = "manifest.json"
+    version = 1
+    hash_chunk = 1024*1024
+
+    def __init__(self, asset_prefix: str, mtime_path: str = './cache/asset_mtimes.json') -> None:
+        self.asset_prefix = asset_prefix
+        self.path = f"{asset_prefix}/{self.filename}"
+        self.mtime_path = mtime_path
+        self.files = {}
+        self.mtimes = {} # Full path: (hash, mtime).
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self) -> bool:
+        '''
+        Load the manifest from disk. Returns False if there isn't one.
+        '''
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path, 'r') as file:
+            data = json.loads(file.read())
+        if data.get('version') != self.version:
+            return False
+
+        self.files = data.get('files', {})
+        for entry in self.files.values():
+            # Older manifests kept them inline.
+            entry.pop('mtime', None)
+        self.loaded = True
+
+        try:
+            with open(self.mtime_path, 'r') as file:
+                self.mtimes = {path: tuple(seen) for path, seen in json.loads(file.read()).items()}
+        except (OSError, ValueError, TypeError):
+            self.mtimes = {}
+        return True
+
+    def save(self) -> None:
+        '''
+        Write the manifest, and the mtimes alongside it.
+        '''
+        with self.lock:
+            data = {'version': self.version, 'files': dict(sorted(self.files.items()))}
+        with open(self.path, 'w') as file:
+            file.write(json.dumps(data, indent=4))
+        try:
+            self.saveMtimes()
+        except OSError:
+            pass
+
+    def saveMtimes(self) -> None:
+        with self.lock:
+            data = dict(sorted(self.mtimes.items()))
+        os.makedirs(os.path.dirname(self.mtime_path) or '.', exist_ok=True)
+        with open(self.mtime_path, 'w') as file:
+            file.write(json.dumps(data))
+
+    def mtime(self, path: str) -> int:
+        '''
+        Given a relative asset path, return the mtime it had when it last matched its
+        manifest hash, or None if we don't know one.
+        '''
+        entry = self.files.get(path)
+        seen = self.mtimes.get(f"{self.asset_prefix}/{path}")
+        if entry is None or seen is None or seen[0] != entry['hash']:
+            return None
+        return seen[1]
+
+    def markChecked(self, path: str, mtime: int) -> None:
+        '''
+        Remember that a file with this mtime matches its manifest hash.
+        '''
+        with self.lock:
+            self.mtimes[f"{self.asset_prefix}/{path}"] = (self.files[path]['hash'], mtime)
+
+    def get(self, path: str) -> dict:
+        '''
+        Given a relative asset path, return its manifest entry, or None if it isn't listed.
+        '''
+        return self.files.get(path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.files
+
+    @classmethod
+    def hashFile(self, path: str) -> str:
+        '''
+        Given a file path, return its blake2b content hash.
+        '''
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as file:
+            while True:
+                chunk = file.read(self.hash_chunk)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def describeFile(self, full_path: str) -> dict:
+        '''
+        Given a file path, hash it and work out its media metadata.
+        '''
+        entry = {
+            'size': os.path.getsize(full_path),
+            'hash': self.hashFile(full_path)
+        }
+
+        extension = os.path.splitext(full_path)[1].lower()
+        if extension in ['.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tga', '.webp']:
+            from pygame import image
+            entry['width'], entry['height'] = image.load(full_path).get_size()
+
+        elif extension == '.wav':
+            with wave.open(full_path, 'rb') as audio:
+                entry['duration'] = round(audio.getnframes()/audio.getframerate(), 3)
+
+        elif extension in ['.ogg', '.mp3', '.flac']:
+            from pygame import mixer
+            if mixer.get_init():
+                entry['duration'] = round(mixer.Sound(full_path).get_length(), 3)
+
+        return entry
+
+    def listFiles(self) -> list:
+        '''
+        Return the relative path of every asset on disk.
+        '''
+        out = []
+        for root, dirs, files in os.walk(self.asset_prefix):
+            dirs[:] = sorted(folder for folder in dirs if not folder.startswith('.'))
+            for name in sorted(files):
+                if name.startswith('.'):
+                    continue
+                path = os.path.relpath(os.path.join(root, name), self.asset_prefix).replace(os.sep, '/')
+                if path != self.filename:
+                    out.append(path)
+        return out
+
+    def build(self, workers: int = 0) -> int:
+        '''
+        Scan the asset folder and rebuild the manifest from scratch. Returns the file count.
+        '''
+        paths = self.listFiles()
+        # Stat first, so a file changed mid-hash doesn't get a newer mtime than its hash.
+        mtimes = [os.stat(f"{self.asset_prefix}/{path}").st_mtime_ns for path in paths]
+        with ThreadPoolExecutor(workers if workers > 0 else None) as pool:
+            entries = pool.map(lambda path: self.describeFile(f"{self.asset_prefix}/{path}"), paths)
+            self.files = dict(zip(paths, entries))
+        for path, mtime in zip(paths, mtimes):
+            self.markChecked(path, mtime)
+        self.loaded = True
+        return len(self.files)
+
+    def checkFile(self, path: str) -> str:
+        '''
+        Given a relative asset path, check it against its entry. Only re-hashes if the size
+        or mtime changed. If the content still matches, the new mtime gets remembered.
+
+        Returns: None if it's fine, or what's wrong with it.
+        '''
+        entry = self.files[path]
+        full_path = f"{self.asset_prefix}/{path}"
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return 'missing'
+
+        if stat.st_size == entry['size'] and stat.st_mtime_ns == self.mtime(path):
+            return None
+        if stat.st_size != entry['size']:
+            return 'size changed'
+        if self.hashFile(full_path) != entry['hash']:
+            return 'content changed'
+
+        # New checkout or just got touched, remember the mtime so we don't hash it next time.
+        self.markChecked(path, stat.st_mtime_ns)
+        return None
+
+    def verify(self, workers: int = 0) -> dict:
+        '''
+        Check every listed file, hashing in parallel where needed. Saves the mtimes if any
+        got refreshed. The manifest itself never gets touched.
+
+        Returns: Dict of relative path to problem, for every file that didn't check out.
+        '''
+        mtimes = dict(self.mtimes)
+        paths = list(self.files.keys())
+        with ThreadPoolExecutor(workers if workers > 0 else None) as pool:
+            results = pool.map(self.checkFile, paths)
+            problems = {path: problem for path, problem in zip(paths, results) if problem is not None}
+
+        if self.mtimes != mtimes:
+            try:
+                self.saveMtimes()
+            except OSError:
+                pass
+        return problems
@@ -0,0 +1,189 @@
+from pygame import event, mixer
+from collections import deque
+import time
+
+from engine.common.validated import ValidatedDict
+
+class MusicPlayer:
+    '''
+    Streams music through pygame.mixer.music, so a track is decoded a bit at a time as it
+    plays instead of all at once like a Sound. Memory stays the same whatever the track
+    lengths or the playlist size.
+
+    There's a playlist. The next track gets handed to the mixer ahead of time, so it
+    starts with no gap. Fades and crossfades are stepped by update, once a frame. The
+    mixer only has one music stream, so a crossfade fades the old track out, then the
+    new one in.
+
+    Tracks are (asset_name, source, category, loops). Sources get turned into something
+    the mixer can stream with open_source, like AssetManager.openAsset, right when they're
+    needed, since a file object can only be streamed once. The category is 'music' or
+    'attract', which picks the volume setting.
+    '''
+    categories = ['music', 'attract']
+    end_event = event.custom_type()
+
+    def __init__(self, sound_config: ValidatedDict, open_source = None) -> None:
+        self.open_source = open_source if open_source is not None else (lambda source: source)
+        self.playlist = deque()
+        self.current = None
+        self.queued = None # Handed to mixer.music.queue, starts when current ends.
+        self.paused = False
+
+        # Fade is (start, duration, from gain, to gain). switch_to is (track, fade in) to
+        # start once it's done, with a track of None to stop.
+        self.gain = 1.0
+        self.fade = None
+        self.switch_to = None
+
+        self.volumes = {}
+        for category in self.categories:
+            self.setVolume(category, sound_config.get_float(f'{category}_volume', 1.0))
+
+        mixer.music.set_endevent(self.end_event)
+
+    def setVolume(self, category: str, volume: float) -> None:
+        '''
+        Set the volume for a category, from 0.0 to 1.0.
+        '''
+        self.volumes[category] = min(1.0, max(0.0, volume))
+        if self.current is not None:
+            self.applyVolume()
+
+    def applyVolume(self) -> None:
+        mixer.music.set_volume(self.volumes[self.current[2]]*self.gain)
+
+    def isPlaying(self) -> bool:
+        return self.current is not None
+
+    def nowPlaying(self) -> str:
+        '''
+        Return the asset name of the current track, or None.
+        '''
+        return self.current[0] if self.current is not None else None
+
+    def play(self, track: tuple, fade: float = 0.0) -> None:
+        '''
+        Play a track now, cutting off whatever's playing. With a fade, the current track
+        fades out over the first half and the new one fades in over the second.
+        '''
+        if fade > 0 and self.current is not None and not self.paused:
+            self.startFade(fade/2, 0.0)
+            self.switch_to = (track, fade/2)
+            return
+        self.startTrack(track, fade)
+
+    def enqueue(self, track: tuple) -> None:
+        '''
+        Add a track to the end of the playlist. Starts it right away if nothing's playing.
+        '''
+        self.playlist.append(track)
+        if self.current is None and self.switch_to is None:
+            self.startTrack(self.playlist.popleft())
+        else:
+            self.preloadNext()
+
+    def stop(self, fade: float = 0.0) -> None:
+        '''
+        Stop the music and clear the playlist, fading out first if asked to.
+        '''
+        self.playlist.clear()
+        if fade > 0 and self.current is not None and not self.paused:
+            self.startFade(fade, 0.0)
+            self.switch_to = (None, 0.0)
+            return
+
+        self.current = None
+        self.queued = None
+        self.fade = None
+        self.switch_to = None
+        mixer.music.stop()
+        mixer.music.unload()
+
+    def pause(self) -> None:
+        if self.current is not None:
+            mixer.music.pause()
+            self.paused = True
+
+    def resume(self) -> None:
+        if self.paused:
+            mixer.music.unpause()
+            self.paused = False
+
+    def startTrack(self, track: tuple, fade_in: float = 0.0) -> None:
+        '''
+        Load a track and start it, fading in if asked to.
+        '''
+        # Loading throws away whatever was queued up behind the old track, so put it back.
+        if self.queued is not None:
+            self.playlist.appendleft(self.queued)
+            self.queued = None
+
+        asset_name, source, category, loops = track
+        mixer.music.load(self.open_source(source))
+        self.current = track
+        self.paused = False
+        self.gain = 0.0 if fade_in > 0 else 1.0
+        self.applyVolume()
+        mixer.music.play(loops)
+
+        self.fade = None
+        if fade_in > 0:
+            self.startFade(fade_in, 1.0)
+        self.preloadNext()
+
+    def preloadNext(self) -> None:
+        '''
+        Hand the next track to the mixer so it starts the moment the current one ends.
+        Not while a crossfade is coming, or if the current track loops forever.
+        '''
+        if not self.playlist or self.queued is not None or self.current is None or self.switch_to is not None:
+            return
+        if self.current[3] < 0:
+            return
+
+        self.queued = self.playlist.popleft()
+        mixer.music.queue(self.open_source(self.queued[1]), loops=self.queued[3])
+
+    def startFade(self, duration: float, to_gain: float) -> None:
+        self.fade = (time.perf_counter(), duration, self.gain, to_gain)
+
+    def handleEvent(self, music_event: event.Event) -> None:
+        '''
+        Handle the mixer's end of track event. Pass every end_event from the event loop here.
+        '''
+        if mixer.music.get_busy() and self.queued is not None:
+            # Queued track took over with no gap.
+            self.current = self.queued
+            self.queued = None
+            self.applyVolume()
+            self.preloadNext()
+
+        elif not mixer.music.get_busy() and self.current is not None and self.switch_to is None:
+            # Ran out. Anything left couldn't be preloaded, so start it now.
+            self.current = None
+            if self.playlist:
+                self.startTrack(self.playlist.popleft())
+
+    def update(self) -> None:
+        '''
+        Step fades and crossfades. Run once a frame.
+        '''
+        if self.fade is None or self.paused:
+            return
+
+        start, duration, from_gain, to_gain = self.fade
+        done = min(1.0, (time.perf_counter()-start)/duration)
+        self.gain = from_gain+(to_gain-from_gain)*done
+        self.applyVolume()
+        if done < 1.0:
+            return
+
+        self.fade = None
+        if self.switch_to is not None:
+            track, fade_in = self.switch_to
+            self.switch_to = None
+            if track is None:
+                self.stop()
+            else:
+                self.startTrack(track, fade_in)
@@ -0,0 +1,150 @@
+import io, mmap, os, struct
+
+class PackView(io.RawIOBase):
+    '''
+    Read-only file object over a slice of a memory-mapped pack. Hands pygame a file
+    without copying the asset out of the pack first.
+    '''
+
+    def __init__(self, view: memoryview) -> None:
+        self.view = view
+        self.pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.pos = min(max(0, offset), len(self.view))
+        return self.pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.view) if size is None or size < 0 else min(len(self.view), self.pos+size)
+        out = self.view[self.pos:end].tobytes()
+        self.pos = end
+        return out
+
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), len(self.view)-self.pos)
+        buffer[:count] = self.view[self.pos:self.pos+count]
+        self.pos += count
+        return count
+
+class AssetPack:
+    '''
+    Single-file asset archive. Laid out as a header, the asset blobs (each aligned),
+    then an index table of every asset's path, offset and size:
+
+        header: magic, version, flags, entry count, index offset
+        blobs:  raw file contents, each starting on an `align` boundary
+        index:  per entry, offset, size, path length, then the utf-8 path
+
+    The pack gets memory-mapped, so opening an asset is a dict hit and a slice.
+    '''
+    magic = b'BEPK'
+    version = 1
+    align = 64
+    header = struct.Struct('<4sHHIQ')
+    entry = struct.Struct('<QQH')
+
+    # Packs opened by the loader's worker processes, by path.
+    shared = {}
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, 'rb')
+        self.stamp = os.fstat(self.file.fileno()).st_mtime_ns
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self.map)
+
+        # We're going to read most of it, so ask the OS to pull the whole thing in up front.
+        if hasattr(self.map, 'madvise') and hasattr(mmap, 'MADV_WILLNEED'):
+            self.map.madvise(mmap.MADV_WILLNEED)
+
+        magic, version, flags, count, index_offset = self.header.unpack_from(self.data, 0)
+        if magic != self.magic or version != self.version:
+            raise ValueError(f"{path} isn't a version {self.version} asset pack!")
+
+        self.entries = {}
+        pos = index_offset
+        for i in range(count):
+            offset, size, path_len = self.entry.unpack_from(self.data, pos)
+            pos += self.entry.size
+            self.entries[bytes(self.data[pos:pos+path_len]).decode('utf-8')] = (offset, size)
+            pos += path_len
+
+    def __contains__(self, asset_path: str) -> bool:
+        return asset_path in self.entries
+
+    def view(self, asset_path: str) -> memoryview:
+        '''
+        Given a relative asset path, return a memoryview of its bytes in the pack.
+        '''
+        offset, size = self.entries[asset_path]
+        return self.data[offset:offset+size]
+
+    def open(self, asset_path: str) -> PackView:
+        '''
+        Given a relative asset path, return a file object for it.
+        '''
+        return PackView(self.view(asset_path))
+
+    def close(self) -> None:
+        self.data.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # Something still has a view into it, let it go when they do.
+            pass
+        self.file.close()
+
+    @classmethod
+    def openShared(self, path: str) -> 'AssetPack':
+        '''
+        Given a pack path, return an open pack, reusing one if this process has it already.
+        '''
+        pack = self.shared.get(path)
+        if pack is None:
+            pack = self.shared[path] = AssetPack(path)
+        return pack
+
+    @classmethod
+    def build(self, asset_prefix: str, pack_path: str, asset_paths: list) -> int:
+        '''
+        Pack the given asset paths (relative to asset_prefix) into a new pack file.
+
+        Returns: The pack size in bytes.
+        '''
+        index = []
+        temp_path = f"{pack_path}.tmp"
+        with open(temp_path, 'wb') as pack:
+            pack.write(b'\0'*self.header.size)
+
+            for asset_path in asset_paths:
+                pack.write(b'\0'*(-pack.tell() % self.align))
+                offset = pack.tell()
+                with open(f"{asset_prefix}/{asset_path}", 'rb') as source:
+                    data = source.read()
+                pack.write(data)
+                index.append((asset_path.encode('utf-8'), offset, len(data)))
+
+            index_offset = pack.tell()
+            for path, offset, size in index:
+                pack.write(self.entry.pack(offset, size, len(path)))
+                pack.write(path)
+            size = pack.tell()
+
+            pack.seek(0)
+            pack.write(self.header.pack(self.magic, self.version, 0, len(index), index_offset))
+
+        os.replace(temp_path, pack_path)
+        return size
@@ -0,0 +1,118 @@
+from pygame import Surface, SRCALPHA, display, image
+from concurrent.futures import ThreadPoolExecutor
+import mmap, os, re, struct, sys
+
+class PixelCache:
+    '''
+    On-disk cache of decoded images, already in the display's pixel layout. Files are
+    keyed by the source's hash and the pixel format, so a changed source or a different
+    display just misses, and the old file gets cleaned up when the new one is written.
+
+    Hits get memory-mapped copy-on-write and wrapped with pygame.image.frombuffer, so warm
+    boots skip PNG decoding entirely, and drawing on a cached image never touches the file. Each file is a small header, then the pixel rows at data_offset:
+
+        magic, version, alpha flag, width, height
+    '''
+    magic = b'BEPX'
+    version = 1
+    header = struct.Struct('<4sHHII')
+    data_offset = 64
+
+    def __init__(self, folder: str) -> None:
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix='PixelCache')
+
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def pixelFormat(self) -> str:
+        '''
+        Return the frombuffer format that matches the display's layout byte for byte,
+        so cached pixels can be used as-is.
+        '''
+        surface = display.get_surface()
+        if surface is not None and surface.get_masks()[0] == 0xff0000 and sys.byteorder == 'little':
+            return 'BGRA'
+        return 'RGBA'
+
+    def fileName(self, asset_path: str, source_key: str, pixel_format: str) -> str:
+        '''
+        Given an asset path, its source key and a pixel format, return the cache file path.
+        '''
+        return f"{self.folder}/{self.filePrefix(asset_path)}{source_key}.{pixel_format}.pix"
+
+    def filePrefix(self, asset_path: str) -> str:
+        return re.sub(r'[^A-Za-z0-9_.-]', '_', asset_path) + '.'
+
+    def load(self, asset_path: str, source_key: str) -> Surface:
+        '''
+        Given an asset path and its source key, return the cached surface, or None on a miss.
+        Only works once the display is up.
+        '''
+        if display.get_surface() is None:
+            return None
+
+        path = self.fileName(asset_path, source_key, self.pixelFormat())
+        try:
+            with open(path, 'rb') as file:
+                pixels = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        try:
+            magic, version, alpha, width, height = self.header.unpack_from(pixels, 0)
+        except struct.error:
+            # Cut short, probably a crash mid-write.
+            pixels.close()
+            self.misses += 1
+            return None
+        if magic != self.magic or version != self.version or len(pixels) < self.data_offset+width*height*4:
+            pixels.close()
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        surface = image.frombuffer(memoryview(pixels)[self.data_offset:self.data_offset+width*height*4], (width, height), self.pixelFormat())
+
+        # With alpha, that's already exactly what convert_alpha would give us, so use the
+        # mapped pixels as-is. The map is private, so writes to them stay in memory. Without, drop the alpha channel so it blits opaque.
+        if alpha:
+            return surface
+        return surface.convert()
+
+    def store(self, asset_path: str, source_key: str, surface: Surface) -> None:
+        '''
+        Save a decoded surface. The pixels get copied out now, the write happens in the background.
+        '''
+        if display.get_surface() is None:
+            return
+
+        pixel_format = self.pixelFormat()
+        alpha = 1 if surface.get_flags() & SRCALPHA else 0
+        width, height = surface.get_size()
+        pixels = image.tobytes(surface, pixel_format)
+        self.writer.submit(self.writeFile, asset_path, self.fileName(asset_path, source_key, pixel_format), alpha, width, height, pixels)
+
+    def writeFile(self, asset_path: str, path: str, alpha: int, width: int, height: int, pixels: bytes) -> None:
+        '''
+        Write a cache file, then clear out any older versions of the same asset.
+        '''
+        try:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(self.header.pack(self.magic, self.version, alpha, width, height).ljust(self.data_offset, b'\0'))
+                file.write(pixels)
+            os.replace(temp_path, path)
+
+            prefix = self.filePrefix(asset_path)
+            for name in os.listdir(self.folder):
+                if name.startswith(prefix) and re.fullmatch(r'[0-9a-z-]+\.[A-Z]+\.pix', name[len(prefix):]) and f"{self.folder}/{name}" != path:
+                    os.remove(f"{self.folder}/{name}")
+        except OSError:
+            pass
+
+    def shutdown(self) -> None:
+        self.writer.shutdown(wait=True)
@@ -0,0 +1,164 @@
+import json, time
+from array import array
+
+from engine.common.constants import LogConstants
+from engine.common.logger import LogManager
+
+class FrameProfiler:
+    '''
+    Per-frame profiler. Records how long each frame took, plus named spans and counters
+    inside it, into fixed-size ring buffers. Nothing gets allocated per frame.
+
+    When disabled, every call returns straight away.
+    '''
+    history = 600 # Frames kept in the ring buffer. 10 seconds at 60 fps.
+    hitch_factor = 1.5 # A frame counts as a hitch once it takes this many frame budgets.
+
+    def __init__(self, logger: LogManager, framerate: int, enabled: bool = False, history: int = 0) -> None:
+        self.logger = logger
+        self.enabled = enabled
+        self.budget = 1.0/framerate if framerate else 0.0
+        if history > 0:
+            self.history = history
+
+        self.frame_times = array('d', [0.0]*self.history)
+        self.spans = {}
+        self.counters = {}
+        self.open_spans = {}
+        self.frame = 0 # Total frames recorded.
+        self.frame_start = 0.0
+
+    def beginFrame(self) -> None:
+        '''
+        Start a new frame. The time since the last call is recorded as the last frame's time.
+        '''
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        if self.frame_start:
+            slot = self.frame % self.history
+            self.frame_times[slot] = now - self.frame_start
+            self.frame += 1
+
+        # Clear out the slot this frame is about to use.
+        slot = self.frame % self.history
+        for ring in self.spans.values():
+            ring[slot] = 0.0
+        for ring in self.counters.values():
+            ring[slot] = 0.0
+        self.frame_start = now
+
+    def beginSpan(self, name: str) -> None:
+        '''
+        Start timing a named chunk of the frame.
+        '''
+        if not self.enabled:
+            return
+        self.open_spans[name] = time.perf_counter()
+
+    def endSpan(self, name: str) -> None:
+        '''
+        Stop timing a named chunk of the frame. Spans hit more than once per frame add up.
+        '''
+        if not self.enabled:
+            return
+
+        start = self.open_spans.pop(name, None)
+        if start is None:
+            return
+
+        ring = self.spans.get(name)
+        if ring is None:
+            ring = self.spans[name] = array('d', [0.0]*self.history)
+        ring[self.frame % self.history] += time.perf_counter() - start
+
+    def count(self, name: str, amount: int = 1) -> None:
+        '''
+        Bump a named counter for this frame.
+        '''
+        if not self.enabled:
+            return
+
+        ring = self.counters.get(name)
+        if ring is None:
+            ring = self.counters[name] = array('d', [0.0]*self.history)
+        ring[self.frame % self.history] += amount
+
+    @classmethod
+    def percentile(self, values: list, pct: float) -> float:
+        '''
+        Given sorted values and a percentile (0-100), return the nearest-rank value.
+        '''
+        if not values:
+            return 0.0
+        return values[min(len(values)-1, max(0, int(round(pct/100*len(values)))-1))]
+
+    def summary(self) -> dict:
+        '''
+        Return percentile summaries of everything in the ring buffer. Times are in ms.
+        '''
+        frames = min(self.frame, self.history)
+        slots = [(self.frame-frames+i) % self.history for i in range(frames)]
+
+        frame_times = sorted(self.frame_times[slot] for slot in slots)
+        dropped = 0
+        hitches = 0
+        if self.budget:
+            for frame_time in frame_times:
+                if frame_time >= self.budget*self.hitch_factor:
+                    hitches += 1
+                    dropped += max(1, round(frame_time/self.budget)-1)
+
+        out = {
+            'frames': frames,
+            'frame_ms': self.summarize(frame_times),
+            'hitches': hitches,
+            'dropped_frames': dropped,
+            'spans_ms': {},
+            'counters': {}
+        }
+        for name, ring in self.spans.items():
+            out['spans_ms'][name] = self.summarize(sorted(ring[slot] for slot in slots))
+        for name, ring in self.counters.items():
+            values = [ring[slot] for slot in slots]
+            out['counters'][name] = {'avg': round(sum(values)/len(values), 2) if values else 0.0, 'max': max(values) if values else 0.0}
+        return out
+
+    def summarize(self, values: list) -> dict:
+        '''
+        Given sorted times in seconds, return avg/p50/p95/p99/max in ms.
+        '''
+        return {
+            'avg': round(sum(values)/len(values)*1000, 3) if values else 0.0,
+            'p50': round(self.percentile(values, 50)*1000, 3),
+            'p95': round(self.percentile(values, 95)*1000, 3),
+            'p99': round(self.percentile(values, 99)*1000, 3),
+            'max': round(values[-1]*1000, 3) if values else 0.0
+        }
+
+    def dumpToLog(self) -> None:
+        '''
+        Write the current summary to the engine log.
+        '''
+        if not self.enabled:
+            return
+
+        summary = self.summary()
+        frame_ms = summary['frame_ms']
+        self.logger.writeLogEntry(f"Profile over {summary['frames']} frames: p50 {frame_ms['p50']}ms, p95 {frame_ms['p95']}ms, p99 {frame_ms['p99']}ms, max {frame_ms['max']}ms, {summary['hitches']} hitches, {summary['dropped_frames']} dropped frames.", LogConstants.STATUS_OK_CYAN, tool="PROFILER")
+        for name, span_ms in summary['spans_ms'].items():
+            self.logger.writeLogEntry(f"Span {name}: avg {span_ms['avg']}ms, p95 {span_ms['p95']}ms, p99 {span_ms['p99']}ms, max {span_ms['max']}ms.", LogConstants.STATUS_OK_CYAN, tool="PROFILER")
+        for name, counter in summary['counters'].items():
+            self.logger.writeLogEntry(f"Counter {name}: avg {counter['avg']}, max {counter['max']}.", LogConstants.STATUS_OK_CYAN, tool="PROFILER")
+
+    def dumpToFile(self, path: str) -> None:
+        '''
+        Write the current summary to a JSON file.
+        '''
+        if not self.enabled:
+            return
+
+        with open(path, 'w') as file:
+            file.write(json.dumps(self.summary(), indent=4))
+        self.logger.writeLogFormat('Wrote profile to %s', path, status=LogConstants.STATUS_OK_CYAN, tool="PROFILER")
@@ -0,0 +1,84 @@
+from pygame import Rect, display
+
+class DirtyRectRenderer:
+    '''
+    Only pushes the parts of the screen that changed. Whatever draws marks the rects it
+    touched, and present merges the overlapping ones and updates just those. If the
+    dirty area gets past full_threshold of the screen, it's cheaper to push the whole
+    thing, and if nothing changed, nothing gets pushed at all.
+
+    With it disabled, every present pushes the whole screen like before.
+    '''
+
+    def __init__(self, resolution: tuple, enabled: bool = True, full_threshold: float = 0.5) -> None:
+        self.screen_rect = Rect((0, 0), resolution)
+        self.enabled = enabled
+        self.full_threshold = full_threshold
+        self.dirty = []
+        self.full = False
+
+        # What the last present did, for the profiler.
+        self.last_rects = 0
+        self.last_area = 0
+
+    def mark(self, rect) -> None:
+        '''
+        Mark part of the screen as changed. Takes anything pygame takes as a rect.
+        '''
+        if not self.full:
+            self.dirty.append(Rect(rect))
+
+    def markAll(self) -> None:
+        '''
+        Mark the whole screen as changed.
+        '''
+        self.full = True
+        self.dirty.clear()
+
+    @classmethod
+    def merge(self, rects: list) -> list:
+        '''
+        Given a list of rects, union every group that overlaps or touches, so no pixel
+        gets pushed twice.
+        '''
+        merged = []
+        for rect in rects:
+            rect = Rect(rect)
+            index = 0
+            while index < len(merged):
+                if merged[index].inflate(2, 2).colliderect(rect):
+                    rect.union_ip(merged.pop(index))
+                    index = 0
+                else:
+                    index += 1
+            merged.append(rect)
+        return merged
+
+    def present(self) -> int:
+        '''
+        Push the changed parts of the screen to the display, then start a new frame.
+
+        Returns: How many rects got pushed. 0 if nothing did, -1 for the whole screen.
+        '''
+        full = self.full or not self.enabled
+        rects = []
+        if not full and self.dirty:
+            rects = [rect.clip(self.screen_rect) for rect in self.merge(self.dirty)]
+            rects = [rect for rect in rects if rect.width and rect.height]
+            full = sum(rect.width*rect.height for rect in rects) > self.full_threshold*self.screen_rect.width*self.screen_rect.height
+
+        self.dirty.clear()
+        self.full = False
+
+        if full:
+            display.update()
+            self.last_rects = -1
+            self.last_area = self.screen_rect.width*self.screen_rect.height
+        elif rects:
+            display.update(rects)
+            self.last_rects = len(rects)
+            self.last_area = sum(rect.width*rect.height for rect in rects)
+        else:
+            self.last_rects = 0
+            self.last_area = 0
+        return self.last_rects
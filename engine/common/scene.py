@@ -0,0 +1,288 @@
+from pygame import Surface, display, event
+
+from engine.common.constants import LogConstants
+from engine.common.logger import LogManager
+from engine.common.transition import Transition
+
+class Scene:
+    '''
+    One screen of the game, like the logo, the loading screen or the test menu. Scenes
+    get registered with a SceneManager by name, made once, and kept.
+
+    Overlay scenes draw over whatever's under them on the stack, which keeps rendering
+    but stops updating, so a test menu can sit over gameplay.
+
+    List the images and sounds a scene needs, and they can be loaded in the background
+    before it's shown.
+    '''
+    name = 'SCENE'
+    caption = ''
+    overlay = False
+    images = []
+    sounds = []
+
+    def __init__(self, engine) -> None:
+        self.engine = engine
+
+    def preload(self) -> None:
+        '''
+        Start loading this scene's assets in the background.
+        '''
+        for image in self.images:
+            self.engine.queueImage(image)
+        for sound in self.sounds:
+            self.engine.queueSound(sound)
+
+    def isLoaded(self) -> bool:
+        return all(image in self.engine.image_cache for image in self.images) and all(sound in self.engine.sound_bank for sound in self.sounds)
+
+    def enter(self, previous: 'Scene') -> None:
+        '''
+        Run when the scene is shown. previous is the scene that was on top, or None.
+        '''
+        pass
+
+    def exit(self, next: 'Scene') -> None:
+        '''
+        Run when the scene is taken off the stack. next is the scene taking over, or None.
+        '''
+        pass
+
+    def update(self) -> None:
+        '''
+        One fixed logic tick. Only the top scene gets these.
+        '''
+        pass
+
+    def render(self, screen) -> None:
+        '''
+        Draw the scene. Mark what changed with engine.renderer.
+        '''
+        pass
+
+    def handleEvent(self, scene_event: event.Event) -> None:
+        '''
+        Handle a pygame event. Only the top scene gets these.
+        '''
+        pass
+
+class SceneManager:
+    '''
+    Registry of scenes and the stack of the ones being shown. Changing scenes runs the
+    exit and enter hooks, logs it, and sets the window caption, so none of that happens
+    on frames where nothing changed.
+
+    Changes can play a Transition from the old screen to the new scene. Scenes don't
+    update while one plays, and it runs on logic ticks like everything else. A change
+    without one cuts whatever transition is playing short.
+    '''
+
+    def __init__(self, engine, logger: LogManager, caption_prefix: str = '') -> None:
+        self.engine = engine
+        self.logger = logger
+        self.caption_prefix = caption_prefix
+
+        self.registry = {}
+        self.scenes = {}
+        self.stack = []
+        self.pending = None # (action, name, transition) waiting on a scene's assets.
+
+        self.transition: Transition = None
+        self.transition_ticks = 0
+        self.transition_length = 0
+        self.settle: Surface = None # Last frame of a finished transition, drawn once.
+
+    def register(self, scene_class: type) -> None:
+        '''
+        Register a Scene subclass under its name.
+        '''
+        self.registry[scene_class.name] = scene_class
+
+    def get(self, name: str) -> Scene:
+        '''
+        Given a scene name, return the scene, making it the first time.
+        '''
+        scene = self.scenes.get(name)
+        if scene is None:
+            if name not in self.registry:
+                self.logger.writeLogEntry(f'Unknown scene {name}!', LogConstants.STATUS_FAIL, tool="SCENE_MGR")
+            scene = self.scenes[name] = self.registry[name](self.engine)
+        return scene
+
+    @property
+    def top(self) -> Scene:
+        return self.stack[-1] if self.stack else None
+
+    def preload(self, name: str) -> None:
+        '''
+        Start loading a scene's assets in the background, ahead of showing it.
+        '''
+        self.get(name).preload()
+
+    def changed(self, previous: Scene) -> None:
+        '''
+        Log the change and update the caption. Run after every stack change.
+        '''
+        scene = self.top
+        if scene is None or scene is previous:
+            return
+        self.logger.writeLogEntry(f'Switching game state to {scene.name}.', LogConstants.STATUS_OK_CYAN)
+        display.set_caption(f'{self.caption_prefix} {scene.caption}'.strip())
+
+    def deferred(self, action: str, name: str, wait_for_assets: bool, transition: Transition) -> bool:
+        '''
+        If asked to, hold off on a change until the scene's assets are loaded.
+        '''
+        if not wait_for_assets:
+            return False
+        scene = self.get(name)
+        if scene.isLoaded():
+            return False
+        scene.preload()
+        self.pending = (action, name, transition)
+        return True
+
+    def startTransition(self, transition: Transition, start: Surface) -> None:
+        '''
+        Given a snapshot of the old screen, render the new scene's first frame offscreen
+        and start playing the transition between them.
+        '''
+        end = Surface(start.get_size())
+        if display.get_surface() is not None:
+            end = end.convert()
+        self.renderScenes(end)
+
+        self.stopTransition()
+        transition.begin(start, end)
+        self.transition = transition
+        self.transition_ticks = 0
+        self.transition_length = max(1, round(transition.duration*self.engine.timestep.tick_rate))
+        self.settle = None
+
+    def stopTransition(self) -> None:
+        '''
+        Drop the transition that's playing, if any, and its cached frames.
+        '''
+        if self.transition is not None:
+            self.transition.finish()
+            self.transition = None
+        self.settle = None
+
+    def switch(self, name: str, wait_for_assets: bool = False, transition: Transition = None) -> None:
+        '''
+        Replace every scene on the stack with this one. With wait_for_assets, the switch
+        happens once its assets are loaded, and the current scene keeps going until then.
+        '''
+        if self.deferred('switch', name, wait_for_assets, transition):
+            return
+        self.pending = None
+        start = self.engine.screen.copy() if transition is not None else None
+        if transition is None:
+            self.stopTransition()
+
+        previous = self.top
+        scene = self.get(name)
+        while self.stack:
+            self.stack.pop().exit(scene)
+        self.stack.append(scene)
+        scene.enter(previous)
+        self.changed(previous)
+
+        if transition is not None:
+            self.startTransition(transition, start)
+
+    def push(self, name: str, wait_for_assets: bool = False, transition: Transition = None) -> None:
+        '''
+        Put a scene on top of the current one, like an overlay.
+        '''
+        if self.deferred('push', name, wait_for_assets, transition):
+            return
+        self.pending = None
+        start = self.engine.screen.copy() if transition is not None else None
+        if transition is None:
+            self.stopTransition()
+
+        previous = self.top
+        scene = self.get(name)
+        self.stack.append(scene)
+        scene.enter(previous)
+        self.changed(previous)
+
+        if transition is not None:
+            self.startTransition(transition, start)
+
+    def pop(self) -> None:
+        '''
+        Take the top scene off, going back to the one under it.
+        '''
+        if not self.stack:
+            return
+        self.stopTransition()
+        scene = self.stack.pop()
+        scene.exit(self.top)
+        self.changed(scene)
+
+    def clear(self) -> None:
+        '''
+        Take every scene off the stack. Run at shutdown.
+        '''
+        self.stopTransition()
+        while self.stack:
+            self.stack.pop().exit(None)
+
+    def update(self) -> None:
+        '''
+        Run a logic tick on the top scene, and any change that was waiting on assets.
+        While a transition plays, just step it.
+        '''
+        if self.transition is not None:
+            self.transition_ticks += 1
+            if self.transition_ticks >= self.transition_length:
+                self.settle = self.transition.end
+                self.transition.finish()
+                self.transition = None
+            return
+
+        if self.pending is not None and self.get(self.pending[1]).isLoaded():
+            action, name, transition = self.pending
+            getattr(self, action)(name, transition=transition)
+
+        if self.stack:
+            self.stack[-1].update()
+
+    def idle(self, budget: float) -> None:
+        '''
+        Use spare frame time, budget seconds of it, to build transition frames ahead.
+        '''
+        if self.transition is not None and self.transition.precomputed:
+            self.transition.warm(budget)
+
+    def renderScenes(self, screen) -> None:
+        '''
+        Draw the top scene, and everything under it if it's an overlay.
+        '''
+        bottom = len(self.stack)-1
+        while bottom > 0 and self.stack[bottom].overlay:
+            bottom -= 1
+        for scene in self.stack[max(bottom, 0):]:
+            scene.render(screen)
+
+    def render(self, screen) -> None:
+        '''
+        Draw the current transition frame, or the scenes.
+        '''
+        if self.transition is not None:
+            self.transition.render(screen, (self.transition_ticks+self.engine.timestep.alpha)/self.transition_length)
+            self.engine.renderer.markAll()
+            return
+
+        # The scenes only redraw what changes, so put down the frame the transition ended on.
+        if self.settle is not None:
+            screen.blit(self.settle, (0, 0))
+            self.engine.renderer.markAll()
+            self.settle = None
+        self.renderScenes(screen)
+
+    def handleEvent(self, scene_event: event.Event) -> None:
+        if self.stack:
+            self.stack[-1].handleEvent(scene_event)
@@ -0,0 +1,74 @@
+from pygame import mixer
+
+from engine.common.validated import ValidatedDict
+
+class ChannelPool:
+    '''
+    Fixed pool of mixer channels. Sounds get played on a free channel, or steal the
+    lowest priority (then oldest) voice if they're at least as important. Every
+    category (sfx, music, attract, system) has its own volume from the config.
+
+    Everything is set up front, so playing a sound doesn't decode or allocate anything.
+    '''
+    categories = ['sfx', 'music', 'attract', 'system']
+
+    def __init__(self, sound_config: ValidatedDict, max_polyphony: int = 16) -> None:
+        mixer.set_num_channels(max_polyphony)
+        self.channels = [mixer.Channel(i) for i in range(max_polyphony)]
+        self.priorities = [0]*max_polyphony
+        self.started = [0]*max_polyphony
+        self.plays = 0 # Bumped every play, used to find the oldest voice.
+
+        self.volumes = {}
+        for category in self.categories:
+            self.setVolume(category, sound_config.get_float(f'{category}_volume', 1.0))
+
+    def setVolume(self, category: str, volume: float) -> None:
+        '''
+        Set the volume for a category, from 0.0 to 1.0.
+        '''
+        self.volumes[category] = min(1.0, max(0.0, volume))
+
+    def findChannel(self, priority: int) -> int:
+        '''
+        Given a priority, return the channel to play on, or -1 if every voice is busier.
+        '''
+        victim = -1
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return index
+            if self.priorities[index] > priority:
+                continue
+            if victim == -1 or (self.priorities[index], self.started[index]) < (self.priorities[victim], self.started[victim]):
+                victim = index
+        return victim
+
+    def play(self, sound: mixer.Sound, category: str = 'sfx', priority: int = 0, volume: float = 1.0, loops: int = 0) -> mixer.Channel:
+        '''
+        Play a decoded sound on the pool.
+
+        Given:
+            - sound: the sound to play.
+            - category: which volume setting applies to it.
+            - priority: higher priorities steal voices from lower ones.
+            - volume: extra volume scale for this sound.
+            - loops: how many extra times to play it, -1 for forever.
+
+        Returns: The channel it's playing on, or None if it got dropped.
+        '''
+        index = self.findChannel(priority)
+        if index == -1:
+            return None
+
+        self.plays += 1
+        self.priorities[index] = priority
+        self.started[index] = self.plays
+
+        channel = self.channels[index]
+        channel.play(sound, loops)
+        channel.set_volume(self.volumes[category]*volume)
+        return channel
+
+    def stopAll(self) -> None:
+        for channel in self.channels:
+            channel.stop()
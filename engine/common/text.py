@@ -0,0 +1,87 @@
+from pygame import Surface, display, font
+
+from engine.common.cache import LRUCache
+from engine.common.loader import AssetLoader
+
+class TextRenderer:
+    '''
+    Text rendering with two caches. Fonts are kept by (source, size), so a font file is
+    only opened once per size, and rendered text is kept by (font, text, color,
+    antialias, background), so drawing the same string every frame is just a blit.
+
+    Both caches are LRU. Fonts are capped by count, text by the memory its pixels take.
+    One renderer is shared by the engine and games, get it with TextRenderer.shared.
+
+    Font sources are a file path, or a (pack path, asset path) tuple like the loader takes.
+    '''
+    renderer: 'TextRenderer' = None
+
+    def __init__(self, font_budget: int = 32, text_budget_mb: int = 16) -> None:
+        self.fonts = LRUCache(font_budget)
+        self.texts = LRUCache(text_budget_mb*1024*1024, lambda surface: surface.get_width()*surface.get_height()*surface.get_bytesize())
+
+    @classmethod
+    def shared(self, font_budget: int = 32, text_budget_mb: int = 16) -> 'TextRenderer':
+        '''
+        Return the shared renderer, making it with these budgets if it doesn't exist yet.
+        '''
+        if TextRenderer.renderer is None:
+            TextRenderer.renderer = TextRenderer(font_budget, text_budget_mb)
+        return TextRenderer.renderer
+
+    def getFont(self, path, size: int) -> font.Font:
+        '''
+        Given a font source and a size, return the loaded font.
+        '''
+        key = (path, size)
+        loaded = self.fonts.get(key)
+        if loaded is None:
+            if not font.get_init():
+                font.init()
+            loaded = font.Font(AssetLoader.openSource(path), size)
+            self.fonts.put(key, loaded)
+        return loaded
+
+    def render(self, path, size: int, text: str, color: tuple, antialias: bool = True, background: tuple = None) -> Surface:
+        '''
+        Given a font, its size and the text, return the rendered text. Rendered once, then
+        cached and shared, so don't draw on the result.
+        '''
+        key = (path, size, text, tuple(color), antialias, tuple(background) if background is not None else None)
+        surface = self.texts.get(key)
+        if surface is None:
+            surface = self.getFont(path, size).render(text, antialias, color, background)
+            if display.get_surface() is not None:
+                surface = surface.convert_alpha() if background is None else surface.convert()
+            self.texts.put(key, surface)
+        return surface
+
+    def draw(self, target: Surface, path, size: int, text: str, color: tuple, pos: tuple, align: int = 0, antialias: bool = True):
+        '''
+        Draw text onto a surface.
+
+        Given:
+            - target: surface to draw on.
+            - path, size: the font.
+            - text, color: what to draw.
+            - pos: where to draw it.
+            - align: what pos is. 0 for the top left, 1 for the center, 2 for the top right.
+
+        Returns: The rect it was drawn at.
+        '''
+        surface = self.render(path, size, text, color, antialias)
+        rect = surface.get_rect()
+
+        if align == 0:
+            rect.topleft = pos
+        elif align == 1:
+            rect.center = pos
+        elif align == 2:
+            rect.topright = pos
+        else: raise Exception('Unknown font position! Please use 0, 1, 2!')
+
+        target.blit(surface, rect)
+        return rect
+
+    def stats(self) -> dict:
+        return {'fonts': self.fonts.stats(), 'texts': self.texts.stats()}
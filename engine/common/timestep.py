@@ -0,0 +1,92 @@
+import time
+
+from engine.common.constants import LogConstants
+from engine.common.logger import LogManager
+
+class FixedTimestep:
+    '''
+    Runs game logic at a fixed tick rate, whatever the render rate is doing. Real time
+    goes into an accumulator every frame, and advance says how many whole ticks fit in
+    it. A slow frame just runs more ticks next frame, so the game stays on time instead
+    of slowing down.
+
+    If the game gets so far behind that catching up would make the next frame slow too
+    (the spiral of death), only max_ticks get run and the rest of the time is dropped.
+
+    alpha is how far between the last tick and the next the frame is, from 0.0 to 1.0,
+    for interpolating positions when rendering.
+    '''
+
+    default_tick_rate = 60
+
+    def __init__(self, tick_rate: int = 60, max_ticks: int = 5, logger: LogManager = None) -> None:
+        if tick_rate <= 0:
+            if logger is not None:
+                logger.writeLogEntry(f"Tick rate has to be above 0, not {tick_rate}. Using {self.default_tick_rate}.", LogConstants.STATUS_WARNING, tool="TIMESTEP")
+            tick_rate = self.default_tick_rate
+        self.tick_rate = tick_rate
+        self.step = 1.0/tick_rate
+        self.max_ticks = max(1, max_ticks)
+
+        self.accumulator = 0.0
+        self.last_time = None
+        self.alpha = 0.0
+
+        # Stats.
+        self.ticks = 0 # Every tick ever run, doubles as the simulation clock.
+        self.catchup_ticks = 0 # Ticks past the first in a frame.
+        self.clamped_frames = 0
+        self.dropped_time = 0.0
+        self.lag = 0.0 # How far behind real time the last frame was, in seconds.
+
+    def reset(self) -> None:
+        '''
+        Forget the time since the last frame. Run after anything that blocks on purpose,
+        like loading, so it doesn't get caught up on.
+        '''
+        self.last_time = time.perf_counter()
+        self.accumulator = 0.0
+        self.alpha = 0.0
+
+    def advance(self) -> int:
+        '''
+        Add the time since the last call. Run once a frame.
+
+        Returns: How many ticks to run this frame.
+        '''
+        now = time.perf_counter()
+        if self.last_time is None:
+            self.last_time = now
+        self.accumulator += now-self.last_time
+        self.last_time = now
+
+        ticks = int(self.accumulator/self.step)
+        self.lag = max(0.0, self.accumulator-self.step)
+        if ticks > self.max_ticks:
+            dropped = (ticks-self.max_ticks)*self.step
+            self.dropped_time += dropped
+            self.accumulator -= dropped
+            self.clamped_frames += 1
+            ticks = self.max_ticks
+
+        self.accumulator -= ticks*self.step
+        self.alpha = self.accumulator/self.step
+        self.ticks += ticks
+        self.catchup_ticks += max(0, ticks-1)
+        return ticks
+
+    def tickTime(self, index: int, ticks: int) -> float:
+        '''
+        Given a tick number out of however many the last advance returned, return the
+        perf_counter time that tick runs up to.
+        '''
+        return self.last_time-self.accumulator-(ticks-1-index)*self.step
+
+    def stats(self) -> dict:
+        return {
+            'tick_rate': self.tick_rate,
+            'ticks': self.ticks,
+            'catchup_ticks': self.catchup_ticks,
+            'clamped_frames': self.clamped_frames,
+            'dropped_ms': round(self.dropped_time*1000, 3)
+        }
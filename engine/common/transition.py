@@ -0,0 +1,141 @@
+from pygame import Surface, display
+import time
+
+class Transition:
+    '''
+    Goes from one picture of the screen to another over duration seconds. The SceneManager
+    hands it a snapshot of the old scene and the first frame of the new one.
+
+    Blended transitions get their frames built once and cached, so playing them back is
+    a single blit a frame, however slow the blend is. Frames get built ahead of time in
+    spare frame time with warm, or on the spot if playback catches up. There are at most
+    `steps` of them, fewer if that many full screens won't fit in budget_mb.
+    '''
+    precomputed = True
+
+    def __init__(self, duration: float = 0.5, steps: int = 16, budget_mb: int = 160) -> None:
+        self.duration = duration
+        self.steps = max(2, steps)
+        self.budget = budget_mb*1024*1024
+        self.start = None
+        self.end = None
+        self.frames = []
+        self.build_time = 0.0 # How long the last frame took to build.
+
+    def begin(self, start: Surface, end: Surface) -> None:
+        '''
+        Given the old and new screens, get ready to play.
+        '''
+        self.start = start
+        self.end = end
+        frame_bytes = end.get_width()*end.get_height()*end.get_bytesize()
+        self.frames = [None]*(min(self.steps, max(2, self.budget//max(1, frame_bytes))) if self.precomputed else 0)
+
+    def drawStep(self, target: Surface, t: float) -> None:
+        '''
+        Draw the transition t of the way through, from 0.0 to 1.0. Subclasses do this.
+        '''
+        target.blit(self.end if t >= 1.0 else self.start, (0, 0))
+
+    def frame(self, index: int) -> Surface:
+        '''
+        Given a frame number, return it, building it if it isn't cached yet.
+        '''
+        surface = self.frames[index]
+        if surface is None:
+            surface = Surface(self.end.get_size())
+            if display.get_surface() is not None:
+                surface = surface.convert()
+            started = time.perf_counter()
+            self.drawStep(surface, index/(len(self.frames)-1))
+            self.frames[index] = surface
+            self.build_time = time.perf_counter()-started
+        return surface
+
+    def warm(self, budget: float) -> bool:
+        '''
+        Build frames ahead of time until budget seconds are used up. Run with spare frame time.
+
+        Returns: True once every frame is built.
+        '''
+        start = time.perf_counter()
+        for index, surface in enumerate(self.frames):
+            if surface is None:
+                # Don't start one that won't finish in time.
+                if time.perf_counter()-start+self.build_time >= budget:
+                    return False
+                self.frame(index)
+        return True
+
+    def render(self, screen: Surface, progress: float) -> None:
+        '''
+        Draw the transition progress of the way through, from 0.0 to 1.0.
+        '''
+        progress = min(1.0, max(0.0, progress))
+        if not self.precomputed:
+            self.drawStep(screen, progress)
+            return
+        screen.blit(self.frame(round(progress*(len(self.frames)-1))), (0, 0))
+
+    def finish(self) -> None:
+        '''
+        Let go of the cached frames and snapshots.
+        '''
+        self.start = None
+        self.end = None
+        self.frames = []
+
+class FadeTransition(Transition):
+    '''
+    Fade the old screen out to a color over the first half, then the new one in from it.
+    '''
+
+    def __init__(self, duration: float = 0.5, color: tuple = (0, 0, 0), steps: int = 16, budget_mb: int = 160) -> None:
+        Transition.__init__(self, duration, steps, budget_mb)
+        self.color = color
+
+    def drawStep(self, target: Surface, t: float) -> None:
+        if t < 0.5:
+            target.blit(self.start, (0, 0))
+            amount = t*2
+        else:
+            target.blit(self.end, (0, 0))
+            amount = (1.0-t)*2
+
+        cover = Surface(target.get_size())
+        cover.fill(self.color)
+        cover.set_alpha(round(255*amount))
+        target.blit(cover, (0, 0))
+
+class CrossfadeTransition(Transition):
+    '''
+    Blend straight from the old screen to the new one.
+    '''
+
+    def drawStep(self, target: Surface, t: float) -> None:
+        target.blit(self.start, (0, 0))
+        self.end.set_alpha(round(255*t))
+        target.blit(self.end, (0, 0))
+        self.end.set_alpha(None)
+
+class SlideTransition(Transition):
+    '''
+    Slide the new screen in over the old one, pushing it out. direction is where the new
+    screen comes from: 'left', 'right', 'top' or 'bottom'. No blending, so it just draws
+    live instead of caching frames.
+    '''
+    precomputed = False
+    directions = {'left': (-1, 0), 'right': (1, 0), 'top': (0, -1), 'bottom': (0, 1)}
+
+    def __init__(self, duration: float = 0.5, direction: str = 'right') -> None:
+        Transition.__init__(self, duration)
+        self.direction = self.directions[direction]
+
+    def drawStep(self, target: Surface, t: float) -> None:
+        width, height = target.get_size()
+        # Ease out, so it lands softly.
+        t = 1.0-(1.0-t)**2
+        offset_x = round(self.direction[0]*width*(1.0-t))
+        offset_y = round(self.direction[1]*height*(1.0-t))
+        target.blit(self.start, (offset_x-self.direction[0]*width, offset_y-self.direction[1]*height))
+        target.blit(self.end, (offset_x, offset_y))
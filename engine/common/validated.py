@@ -38,14 +38,16 @@ class ValidatedDict(dict):
 
         Parameters:
             name - Name of attribute
-            default - The default to return if the value doesn't exist, or isn't a float.
+            default - The default to return if the value doesn't exist, or isn't a number.
 
         Returns:
-            A float.
+            A float. Whole numbers like 1 come out of JSON as integers, so those count too.
         """
         val = self.get(name)
         if val is None:
             return default
+        if type(val) == int:
+            return float(val)
         if type(val) != float:
             return default
         return val
@@ -1,7 +1,17 @@
 # Main game engine.
 # We setup the engine, start a game thread, and stay running with a local API for getting states
 
-import pygame, argparse
+import argparse, os, sys, time
+
+# For the benchmark's startup time.
+started = time.perf_counter()
+
+# Benchmarks print JSON to stdout, so pygame can't say hello on import. That's before the
+# args get parsed, so look for -b/--benchmark (or the start of it) by hand.
+if any(arg.startswith('-b') or (len(arg.split('=')[0]) > 2 and '--benchmark'.startswith(arg.split('=')[0])) for arg in sys.argv[1:]):
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import pygame
 
 # Start importing libs
 from engine.common.jsondata import JSONData
@@ -10,21 +20,56 @@ from engine.common.logger import LogManager
 from engine.common.constants import LogConstants
 from engine.screen import Screen
 from engine.common.asset import AssetManager
+from engine.common.profiler import FrameProfiler
+from engine.common.music import MusicPlayer
+from engine.common.render import DirtyRectRenderer
+from engine.common.timestep import FixedTimestep
+from engine.common.scene import SceneManager
+from engine.scenes import engine_scenes, LogoTransition
+from engine.benchmark import EngineBenchmark
+from engine.io.manager import IOManager
+from engine.io.hub import IOHub
+from engine.io.protocol import InputState
+from engine.io.poller import InputBindings, InputPoller
+from engine.io.output import OutputChannel
 
 # Init the args
 parser = argparse.ArgumentParser()
 parser.add_argument('-n', '--no_jingle', help="Set to 'false' to disable the jingle.", action="store_true")
 parser.add_argument('-l', '--loglevel', help="System loglevel. Positions are 'disable', 'enable', 'debug', and 'errors'.", default='enable', choices=['disable', 'enable', 'debug', 'errors'])
-parser.add_argument('-q', '--quickstart', help="Enable system quickstart. Disables file checking and updating. Might break online services.", action="store_true")
+parser.add_argument('-q', '--quickstart', help="Enable system quickstart. Skips the logo and the asset file check, disables updating. Might break online services.", action="store_true")
+parser.add_argument('-p', '--profile', help="Record per-frame timings. Always on with '--loglevel debug'. Press F10 to dump them to the log.", action="store_true")
+parser.add_argument('--profile_file', help="Also dump frame timings to this JSON file on F10 and at shutdown.", default=None)
+parser.add_argument('-w', '--logwriter', help="How the logfile gets written. 'queue' writes on a background thread, 'direct' writes on the caller.", default='queue', choices=['queue', 'direct'])
+parser.add_argument('--logqueue', help="What to do with log entries when the writer queue is full.", default='drop', choices=['drop', 'block'])
+parser.add_argument('-b', '--benchmark', help=f"Run headless with the framerate uncapped, time these comma-separated scenarios and print the results as JSON. Scenarios are {', '.join(EngineBenchmark.scenarios)}.", default=None)
+parser.add_argument('--frames', help="Frames to run each benchmark scenario for.", type=int, default=600)
+parser.add_argument('--benchmark_file', help="Write the benchmark results to this JSON file instead of printing them. Console logging is off while benchmarking either way, the logfile still gets it.", default=None)
 args = parser.parse_args()
 
-# Init the logger.
-logger = LogManager(args.loglevel)
+# Benchmarks run without a window or sound card, so they run the same anywhere.
+if args.benchmark:
+    benchmark_scenarios = [name.strip() for name in args.benchmark.split(',') if name.strip()]
+    for name in benchmark_scenarios:
+        if name not in EngineBenchmark.scenarios:
+            parser.error(f"Unknown benchmark scenario '{name}'. Scenarios are {', '.join(EngineBenchmark.scenarios)}.")
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+# Init the logger. Benchmark results go to stdout, so log entries only go to the logfile.
+logger = LogManager(args.loglevel, args.logwriter, args.logqueue, console=not args.benchmark)
 logger.initLogFile()
 
 path_prefix = './engine/json'
 config = JSONData(logger).loadJsonFile(f'{path_prefix}/config.json')
 game = JSONData(logger).loadJsonFile(f'{path_prefix}/game.json')
+bindings = JSONData(logger).loadJsonFile(f'{path_prefix}/bindings.json')
+logger.setRotation(config.get_dict('system').get_dict('logging'))
+logger.setStructuredLog(config.get_dict('system').get_dict('logging').get_bool('structured'))
+if args.benchmark:
+    # No monitors to go fullscreen on, and nothing to wait on.
+    config['system'].setdefault('display', {})['video_mode'] = 'window'
+    config['system'].setdefault('timing', {})['framerate'] = 0
 
 class GameEngine(
     AssetManager
@@ -32,10 +77,14 @@ class GameEngine(
     def __init__(self, engine_config: ValidatedDict, game_config: ValidatedDict, args: argparse.Namespace, logger: LogManager):
         AssetManager.__init__(self, config.get_dict('system'), logger)
         self.run = True
-        self.framerate = 60
+        timing_conf = engine_config.get_dict('system').get_dict('timing')
+        self.framerate = timing_conf.get_int('framerate', 60)
         self.clock = pygame.time.Clock()
+        self.frame_started = time.perf_counter()
+        self.timestep = FixedTimestep(timing_conf.get_int('tick_rate', 60), timing_conf.get_int('max_catchup_ticks', 5), logger)
         self.args = args
         self.logger = logger
+        self.profiler = FrameProfiler(logger, self.framerate, args.profile or args.loglevel == LogConstants.LOG_DEBUG)
 
         self.engine_conf = engine_config.get_dict('system')
         self.ver = self.engine_conf.get_dict('engine', ValidatedDict({})).get_str('build')
@@ -46,148 +95,256 @@ class GameEngine(
         # Let's start up the game.
         # Init pygame
         pygame.init()
+        self.initSound()
+
+        # The IO socket, read on its own thread, and any other IO devices, all on the hub's
+        # thread. The newest inputs from both get picked up once a frame.
+        inputs_conf = engine_config.get_dict('system').get_dict('inputs')
+        self.io = IOManager(inputs_conf, self.logger)
+        self.io.start()
+        devices = inputs_conf.get('devices')
+        self.io_hub = IOHub(devices if isinstance(devices, list) else [], self.logger)
+        self.io_hub.start()
+        self.io_state = self.io.state
+
+        # Button presses from all of it, timestamped on the poller's thread. Game logic reads
+        # them a tick at a time from input_events. Without any IO running, there's no thread.
+        io_sources = [source for source in (self.io, self.io_hub) if source.thread is not None]
+        self.inputs = InputPoller(io_sources, InputBindings(bindings, self.logger), inputs_conf.get_int('poll_rate', 100), inputs_conf.get_int('input_buffer', 1024))
+        self.inputs.start()
+        self.input_events = []
+
+        # Lamps and LEDs. Set them whenever, what changed goes out once at the end of the frame.
+        self.lamps = OutputChannel(self.sendIOPacket, inputs_conf.get_int('output_bytes', 64), inputs_conf.get_int('output_rate', 60), inputs_conf.get_float('output_keyframe', 1.0))
 
         # Init pygame screen, return
         self.screen, self.resolution = Screen(engine_config.get_dict('system'), self.logger).initScreen()
+        self.setResolution(self.resolution, engine_config.get_dict('system').get_dict('display').get_str('design_resolution', '1920x1080'))
+        self.convertCachedImages()
+        self.loadAtlas()
+        display_conf = engine_config.get_dict('system').get_dict('display')
+        self.renderer = DirtyRectRenderer(self.resolution, display_conf.get_bool('dirty_rects', True), display_conf.get_float('full_update_ratio', 0.5))
+        self.transition_args = {'steps': display_conf.get_int('transition_steps', 16), 'budget_mb': display_conf.get_int('transition_cache_mb', 160)}
         pygame.display.update()
 
-        # Current scene/screen state. Here's a list of them.
-        # - INIT
-        # - WAITING
+        # Scenes. The engine's own are in engine/scenes.py:
         # - LOGO_IN
         # - LOADING
-        # - ERROR
+        # - WAITING
         # - LOGO_OUT
-        # - UPDATING
-        # - TEST_MODE
-        # We will init this with None so that the engine can decide what to do.
-
-        self.last_state = 'INIT'
-        self.current_state = 'INIT'
+        # Games register theirs on self.scenes, and overlays like the test menu get pushed on top.
+        self.scenes = SceneManager(self, self.logger, f'BasedEngine V{self.ver}')
+        for scene in engine_scenes:
+            self.scenes.register(scene)
         self.current_events = None
 
         # Empty dict for assets.
         self.assets = {}
         self.load_assets()
 
-        # Now, we begin the loop
-        self.engineLoop()
+        # Check the asset files while the logo fades in. Quickstart skips this.
+        if not self.args.quickstart and not self.args.benchmark:
+            self.startAssetCheck()
+
+        # Now, we begin the loop. Or time it.
+        if self.args.benchmark:
+            self.runBenchmark()
+        else:
+            self.engineLoop()
 
     def load_assets(self) -> None:
         '''
-        Load in all needed assets. Run at start.
+        Queue up all needed assets. Run at start. The startup scenes' assets decode in the
+        background while the logo fades in, and updateLoading picks them up as they finish.
         '''
-        # Images
-        image_list = [
-            'logo.png'
-        ]
-        for image in image_list:
-            self.assets[image] = AssetManager.loadImage(self, image)
+        for scene in ['LOGO_IN', 'LOADING', 'LOGO_OUT']:
+            self.scenes.preload(scene)
 
-    def eventHandler(self):
+    def updateLoading(self) -> None:
         '''
-        Handles engine events and a few other things.
+        Grab whatever the loader has finished. Run once a frame.
         '''
-        engine_mode = {
-            'INIT': "(init...)",
-            'WAITING': "(game loading...)",
-            'LOGO_IN': "(loading...)",
-            'LOGO_OUT': "(goodbye!)",
-            'LOADING': "(loading...)",
-            'ERROR': "(error!)",
-            'UPDATING': "(updating...)",
-            'TEST_MODE': "(test_menu)"
-        }[self.current_state]
+        if self.loader.isDone():
+            return
 
-        # Log dat shit
-        if self.current_state != self.last_state:
-            self.logger.writeLogEntry(f'Switching game state to {self.current_state}.', LogConstants.STATUS_OK_CYAN)
-            self.last_state = self.current_state
+        self.profiler.beginSpan('loading')
+        for asset_name, asset in AssetManager.pollAssets(self):
+            self.assets[asset_name] = asset
+        self.profiler.endSpan('loading')
 
-        pygame.display.set_caption(f'BasedEngine V{self.ver} {engine_mode}')
+    def sendIOPacket(self, data: bytes) -> None:
+        '''
+        Send a packet to every IO board, on the IO socket and the hub.
+        '''
+        self.io.sendPacket(data)
+        self.io_hub.sendPacket(data)
 
+    def eventHandler(self):
+        '''
+        Handles engine events and a few other things.
+        '''
+        self.profiler.beginSpan('events')
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                self.run = False
-                self.fadeLogoOut()
-
-    def fadeLogoIn(self):
+                # Fade out, or just go if we're already fading.
+                if self.scenes.top is not None and self.scenes.top.name == 'LOGO_OUT':
+                    self.run = False
+                else:
+                    self.scenes.switch('LOGO_OUT', transition=LogoTransition(self, False))
+
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F10:
+                self.dumpProfile()
+
+            elif event.type == MusicPlayer.end_event and self.music is not None:
+                self.music.handleEvent(event)
+
+            else:
+                # Bound keys go in with the IO inputs too.
+                if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+                    self.inputs.pushKey(event.key, event.type == pygame.KEYDOWN)
+                self.scenes.handleEvent(event)
+        self.updateMusic()
+        self.profiler.endSpan('events')
+
+    def dumpProfile(self) -> None:
         '''
-        Render the Logo and the background. Also play a jingle. 
+        Dump the frame profiler to the log, and to a file if we were asked to.
         '''
-        # Set the state
-        self.current_state = "LOGO_IN"
-
-        # Start by playing the jingle. Check the args.
-        if not self.args.no_jingle:
-            AssetManager.playSfx(self, 'jingle.wav')
-
-        # Blank the screen
-        self.screen.fill((0, 0, 0))
-
-        logo = self.assets.get('logo.png')
+        self.profiler.dumpToLog()
+        if self.profiler.enabled:
+            self.inputs.latency.dumpToLog(self.logger)
+        stats = self.timestep.stats()
+        self.logger.writeLogEntry(f"Timestep: {stats['ticks']} ticks at {stats['tick_rate']}Hz, {stats['catchup_ticks']} catch-up ticks, {stats['clamped_frames']} clamped frames, {stats['dropped_ms']}ms dropped.", LogConstants.STATUS_OK_CYAN, tool="PROFILER")
+        if self.args.profile_file:
+            self.profiler.dumpToFile(self.args.profile_file)
+
+    def tickFrame(self) -> None:
+        '''
+        Lock to the framerate, and start a new frame for the profiler. Any spare time
+        before the next frame goes to getting ahead on transition frames.
+        '''
+        spare = 1/self.framerate-(time.perf_counter()-self.frame_started)-0.002 if self.framerate else 0
+        if spare > 0:
+            self.profiler.beginSpan('idle')
+            self.scenes.idle(spare)
+            self.profiler.endSpan('idle')
+
+        self.profiler.beginSpan('tick')
+        self.clock.tick(self.framerate)
+        self.profiler.endSpan('tick')
+        self.frame_started = time.perf_counter()
+        self.profiler.beginFrame()
+
+    def runTicks(self) -> None:
+        '''
+        Run however many logic ticks are due this frame. Run once a frame, after tickFrame.
+        '''
+        ticks = self.timestep.advance()
+        for tick in range(ticks):
+            self.input_events = self.inputs.read(int(self.timestep.tickTime(tick, ticks)*1e9))
+            self.updateTick()
+        self.profiler.count('catchup_ticks', max(0, ticks-1))
+        self.profiler.count('lag_ms', self.timestep.lag*1000)
+
+    def updateTick(self) -> None:
+        '''
+        One fixed step of game logic. Runs timestep.tick_rate times a second whatever the
+        framerate, so anything that has to keep time goes here, not in the render.
+        input_events has the button presses and releases that happened up to this tick.
+        '''
+        self.profiler.count('ticks')
+        self.scenes.update()
 
-        for i in range(50):
-            self.eventHandler()
-            self.clock.tick(self.framerate)
+    def renderFrame(self) -> None:
+        '''
+        Draw the scenes.
+        '''
+        self.profiler.beginSpan('render')
+        self.scenes.render(self.screen)
+        self.profiler.endSpan('render')
 
-            # Fade screen to white with the fade in.
-            self.screen.fill((160+i, 160+i, 160+i))
+    def presentFrame(self) -> None:
+        '''
+        Push whatever changed this frame to the display. Mark what you drew with
+        self.renderer.mark, or markAll if the whole screen changed.
+        '''
+        self.profiler.beginSpan('present')
+        rects = self.renderer.present()
+        self.inputs.latency.presented()
+        self.lamps.flush()
+        self.profiler.endSpan('present')
+        self.profiler.count('present_rects', max(rects, 0))
+        self.profiler.count('present_pixels', self.renderer.last_area)
 
-            logo.set_alpha(115+(i*2))
-            self.screen.blit(logo, ((self.resolution[0]-500)/2, 60-i))
-            pygame.display.update()
-            i += 1
+    def engineLoop(self):
+        '''
+        The main loop of the engine. Everything is started by this loop.
+        '''
+        # Start with the logo, or skip straight to loading on quickstart.
+        if self.args.quickstart:
+            self.scenes.switch('LOADING')
+        else:
+            self.scenes.switch('LOGO_IN', transition=LogoTransition(self, True))
+        self.timestep.reset()
+        while self.run:
+            self.runFrame()
+        self.shutdown()
 
-    def fadeLogoOut(self):
+    def runFrame(self) -> None:
         '''
-        Render the Logo and the background fading out.
+        One pass of the main loop.
         '''
-        # Set the state
-        self.current_state = "LOGO_OUT"
+        # Grab the newest IO board inputs. The IO threads already unpacked them.
+        self.io_state = InputState.merge((self.io.state, self.io_hub.state)) if self.io_hub.devices else self.io.state
 
-        # Blank the screen
-        self.screen.fill((210, 210, 210))
+        # First, we should start our loop with the event manager
+        self.eventHandler()
 
-        logo = self.assets.get('logo.png')
+        # Now, let's make sure that the game is locked to a framerate.
+        self.tickFrame()
 
-        for i in range(55):
-            self.eventHandler()
-            self.clock.tick(self.framerate)
+        # Keep loading in the background.
+        self.updateLoading()
 
-            # Fade screen to white with the fade in.
-            self.screen.fill((160-i, 160-i, 160-i))
+        # Game logic runs at its own fixed rate, catching up if the last frame was slow.
+        self.runTicks()
 
-            logo.set_alpha(115-(i*2))
-            self.screen.blit(logo, ((self.resolution[0]-500)/2, 60+i))
-            pygame.display.update()
-            i += 1
+        # Draw and update screen.
+        self.renderFrame()
+        self.presentFrame()
 
-    def engineLoop(self):
+    def runBenchmark(self) -> None:
         '''
-        The main loop of the engine. Everything is started by this loop.
+        Run the benchmark scenarios from the args instead of the game, and write out the results.
         '''
-        has_looped = False
-        while self.run:
-            # First, we should start our loop with the event manager
-            self.eventHandler()
-
-            # Now, let's make sure that the game is locked to a framerate.
-            self.clock.tick(self.framerate)
-
-            # Load the fade in animation, but only if it's the first loop.
-            if not has_looped and not self.args.quickstart:
-                self.fadeLogoIn()
+        startup = time.perf_counter()-started
+        benchmark = EngineBenchmark(self, max(1, self.args.frames))
+        results = benchmark.run(benchmark_scenarios, startup)
+        self.shutdown()
+        EngineBenchmark.write(results, self.args.benchmark_file)
 
-            # Update screen.
-            pygame.display.update()
-            # Set has_looped.
-            has_looped = True
+    def shutdown(self) -> None:
+        '''
+        Stop everything running in the background and log the stats. Run once the loop's done.
+        '''
+        self.scenes.clear()
+        self.stopMusic()
+        self.inputs.shutdown()
+        stats = self.lamps.stats()
+        self.logger.writeLogEntry(f"Lamp outputs: {stats['updates']} updates in {stats['packets']} packets ({stats['keyframes']} keyframes), {stats['bytes_sent']} bytes.", LogConstants.STATUS_OK_BLUE, tool="IO_MGR")
+        self.io.shutdown()
+        self.io_hub.shutdown()
+        self.stopLoader()
+        if self.pixel_cache is not None:
+            self.pixel_cache.shutdown()
+        self.dumpProfile()
+        self.logCacheStats()
         self.logger.writeLogEntry('Goodbye! Thank you for playing.', LogConstants.STATUS_HEADER)
 
 if __name__ == "__main__":
     GameEngine(config, game, args, logger)
 
     # Close for good luck.
+    logger.closeLogFile()
     pygame.display.quit()
     exit()
\ No newline at end of file
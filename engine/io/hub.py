@@ -0,0 +1,394 @@
+import asyncio, os, sys, threading, time
+
+from engine.common.constants import LogConstants
+from engine.common.logger import LogManager
+from engine.io.protocol import InputState, IOPacket
+
+try:
+    import termios, tty
+except ImportError:
+    termios = None
+
+class IODevice:
+    '''
+    One peripheral on the IO hub. Speaks the same packets as the IO socket, see
+    engine/io/README.md.
+
+    Runs as a task on the hub's loop: connect, read until it fails or goes quiet for
+    timeout seconds, then wait and connect again, backing off up to max_retry_delay.
+    A device that's gone quiet has its inputs dropped, so nothing stays held down.
+
+    Outputs wait in a short queue. If the device can't keep up, the oldest get dropped,
+    since only the newest lamp states matter.
+    '''
+    kind = None
+
+    def __init__(self, hub: 'IOHub', config: dict) -> None:
+        self.hub = hub
+        self.name = config.get('name', self.kind)
+        self.player = config.get('player', 0) # 1 or 2 to put this device's first player on that player, 0 for as-is.
+        self.timeout = float(config.get('timeout', 1.0))
+        self.retry_delay = float(config.get('retry_delay', 0.5))
+        self.max_retry_delay = float(config.get('max_retry_delay', 5.0))
+        self.output_queue = int(config.get('output_queue', 8))
+        self.outputs: asyncio.Queue = None # Made on the hub's loop.
+
+        self.state: InputState = None
+        self.sequence = None
+        self.connected = False
+
+        # Stats.
+        self.packets = 0
+        self.stale = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.dropped_outputs = 0
+
+    async def run(self) -> None:
+        '''
+        Keep the device connected until the hub stops.
+        '''
+        self.outputs = asyncio.Queue(self.output_queue)
+        delay = self.retry_delay
+        while True:
+            try:
+                await self.open()
+            except (OSError, ValueError) as e:
+                self.hub.log(f"Couldn't open {self.name}: {e}", LogConstants.STATUS_WARNING)
+            else:
+                self.connected = True
+                delay = self.retry_delay
+                self.hub.log(f'{self.name} connected.', LogConstants.STATUS_OK_BLUE)
+                try:
+                    await self.serve()
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self.hub.log(f'{self.name} went quiet, reconnecting.', LogConstants.STATUS_WARNING)
+                except (OSError, asyncio.IncompleteReadError) as e:
+                    self.hub.log(f'{self.name} disconnected: {e or "closed"}.', LogConstants.STATUS_WARNING)
+                finally:
+                    self.connected = False
+                    self.drop()
+                    self.close()
+
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay*2, self.max_retry_delay)
+
+    async def open(self) -> None:
+        '''
+        Connect to the device. Subclasses do this.
+        '''
+        raise NotImplementedError
+
+    async def serve(self) -> None:
+        '''
+        Read from the device until it fails or times out. Subclasses do this.
+        '''
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def drop(self) -> None:
+        '''
+        Forget the device's inputs.
+        '''
+        if self.state is not None:
+            self.state = None
+            self.hub.publish()
+
+    def receive(self, data, received: int) -> None:
+        '''
+        Given an input packet's bytes, update this device's inputs.
+        '''
+        fields = IOPacket.input.unpack_from(data)
+        if fields[0] != IOPacket.magic or fields[1] != IOPacket.version or fields[2] != IOPacket.KIND_INPUT:
+            return
+        sequence = fields[3]
+        if self.sequence is not None and self.state is not None and not IOPacket.newer(sequence, self.sequence):
+            self.stale += 1
+            return
+        self.sequence = sequence
+        self.packets += 1
+
+        buttons = fields[5:5+IOPacket.players]
+        axes = fields[5+IOPacket.players:]
+        if self.player:
+            # Move the device's first player, and their half of the axes, over to ours.
+            half = IOPacket.axes//IOPacket.players
+            slot = self.player-1
+            buttons = tuple(buttons[0] if index == slot else 0 for index in range(IOPacket.players))
+            axes = tuple(axes[index-slot*half] if slot*half <= index < (slot+1)*half else 0 for index in range(IOPacket.axes))
+        self.state = InputState(sequence, fields[4], received, buttons, axes)
+        self.hub.publish()
+
+    def queueOutput(self, data: bytes) -> None:
+        '''
+        Queue an output packet, making room if the device is behind. Runs on the hub's loop.
+        '''
+        if not self.connected:
+            return
+        if self.outputs.full():
+            self.outputs.get_nowait()
+            self.dropped_outputs += 1
+        self.outputs.put_nowait(data)
+
+class StreamDevice(IODevice):
+    '''
+    A device on a byte stream. Packets come back to back, so if the stream gets out of
+    step, skip ahead to the next magic.
+    '''
+
+    def __init__(self, hub: 'IOHub', config: dict) -> None:
+        IODevice.__init__(self, hub, config)
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+
+    async def readPacket(self) -> bytes:
+        size = IOPacket.input.size
+        data = await asyncio.wait_for(self.reader.readexactly(size), self.timeout)
+        while data[:2] != IOPacket.magic:
+            start = data.find(IOPacket.magic, 1)
+            if start < 0:
+                # Could be half a magic on the end.
+                start = size-1 if data[-1:] == IOPacket.magic[:1] else size
+            data = data[start:]+await asyncio.wait_for(self.reader.readexactly(start), self.timeout)
+        return data
+
+    async def writeOutputs(self) -> None:
+        while True:
+            data = await self.outputs.get()
+            self.writer.write(data)
+            # Wait for the device to take it, so a slow one backs up in the queue, not in memory.
+            await asyncio.wait_for(self.writer.drain(), self.timeout)
+
+    async def serve(self) -> None:
+        writer = asyncio.ensure_future(self.writeOutputs())
+        try:
+            while True:
+                # A failed write stops the reads too.
+                if writer.done():
+                    writer.result()
+                self.receive(await self.readPacket(), time.perf_counter_ns())
+        finally:
+            writer.cancel()
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        while self.outputs is not None and not self.outputs.empty():
+            self.outputs.get_nowait()
+
+class SerialDevice(StreamDevice):
+    '''
+    A serial port, or anything else that looks like one, like a pty standing in for a board.
+    '''
+    kind = 'serial'
+
+    def __init__(self, hub: 'IOHub', config: dict) -> None:
+        StreamDevice.__init__(self, hub, config)
+        self.path = config['path']
+        self.baud = int(config.get('baud', 115200))
+        self.read_transport = None
+
+    async def open(self) -> None:
+        if termios is None:
+            raise ValueError('serial devices need termios')
+
+        fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            tty.setraw(fd)
+            speed = getattr(termios, f'B{self.baud}', None)
+            if speed is not None:
+                attrs = termios.tcgetattr(fd)
+                attrs[4] = attrs[5] = speed
+                termios.tcsetattr(fd, termios.TCSANOW, attrs)
+        except termios.error:
+            pass
+
+        # The read and write sides each want their own file object.
+        loop = asyncio.get_running_loop()
+        self.reader = asyncio.StreamReader()
+        self.read_transport, protocol = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(self.reader), open(fd, 'rb', buffering=0))
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, open(os.dup(fd), 'wb', buffering=0))
+        self.writer = asyncio.StreamWriter(transport, protocol, None, loop)
+
+    def close(self) -> None:
+        StreamDevice.close(self)
+        if self.read_transport is not None:
+            self.read_transport.close()
+            self.read_transport = None
+
+class UnixDevice(StreamDevice):
+    '''
+    A device behind a Unix socket, usually a driver running as its own process.
+    '''
+    kind = 'unix'
+
+    def __init__(self, hub: 'IOHub', config: dict) -> None:
+        StreamDevice.__init__(self, hub, config)
+        self.path = config['path']
+
+    async def open(self) -> None:
+        if not hasattr(asyncio, 'open_unix_connection') or sys.platform == 'win32':
+            raise ValueError('unix sockets aren\'t supported here')
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+
+class UDPDevice(IODevice):
+    '''
+    A board on the network at address:port. Inputs only count from that address.
+    '''
+    kind = 'udp'
+
+    class Protocol(asyncio.DatagramProtocol):
+        def __init__(self, device: 'UDPDevice') -> None:
+            self.device = device
+
+        def datagram_received(self, data: bytes, addr: tuple) -> None:
+            if len(data) == IOPacket.input.size:
+                self.device.last_seen = time.perf_counter()
+                self.device.receive(data, time.perf_counter_ns())
+
+        def error_received(self, exc: Exception) -> None:
+            pass
+
+    def __init__(self, hub: 'IOHub', config: dict) -> None:
+        IODevice.__init__(self, hub, config)
+        self.address = (config.get('address', '127.0.0.1'), int(config['port']))
+        self.local_port = int(config.get('local_port', 0))
+        self.transport = None
+        self.last_seen = 0.0
+
+    async def open(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.transport, protocol = await loop.create_datagram_endpoint(lambda: self.Protocol(self), local_addr=('0.0.0.0', self.local_port), remote_addr=self.address)
+        self.last_seen = time.perf_counter()
+
+    async def serve(self) -> None:
+        # Nothing to reconnect on UDP, just drop the inputs while it's quiet.
+        while True:
+            try:
+                data = await asyncio.wait_for(self.outputs.get(), self.timeout/2)
+                self.transport.sendto(data)
+            except asyncio.TimeoutError:
+                pass
+            if self.state is not None and time.perf_counter()-self.last_seen >= self.timeout:
+                self.timeouts += 1
+                self.drop()
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+class IOHub:
+    '''
+    Runs every configured IO device on one asyncio loop on its own thread, so a cabinet
+    full of peripherals doesn't need a thread each or a blocking read in the game loop.
+
+    Device inputs get merged into one InputState: buttons are or'd together, and each
+    axis goes to whichever device is pushing it hardest. Like the IO manager, the game
+    just reads state, and notify, if set, gets run on the hub's thread after every new one.
+    '''
+    device_types = {device.kind: device for device in [SerialDevice, UnixDevice, UDPDevice]}
+
+    def __init__(self, devices_config: list, logger: LogManager) -> None:
+        self.logger = logger
+        self.devices_config = devices_config or []
+        self.devices = []
+        self.state = InputState.neutral()
+        self.frame = 0
+        self.out_sequence = 0
+        self.notify = None
+
+        self.loop = None
+        self.thread = None
+        self.started = threading.Event()
+
+    def log(self, text: str, status: int = LogConstants.STATUS_OK_BLUE) -> None:
+        self.logger.writeLogEntry(text, status, tool="IO_HUB")
+
+    def start(self) -> bool:
+        '''
+        Start the hub's thread and connect every device.
+
+        Returns: False if there were no devices to run.
+        '''
+        for config in self.devices_config:
+            device_type = self.device_types.get(config.get('type'))
+            if device_type is None:
+                self.log(f"Unknown IO device type {config.get('type')}, skipping it.", LogConstants.STATUS_WARNING)
+                continue
+            try:
+                self.devices.append(device_type(self, config))
+            except (KeyError, ValueError) as e:
+                self.log(f"Bad config for IO device {config.get('name', config.get('type'))}: {e}", LogConstants.STATUS_WARNING)
+        if not self.devices:
+            return False
+
+        self.thread = threading.Thread(target=self.hubThread, name='IOHub', daemon=True)
+        self.thread.start()
+        self.started.wait()
+        self.log(f'IO hub running {len(self.devices)} devices.')
+        return True
+
+    def hubThread(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.tasks = [self.loop.create_task(device.run()) for device in self.devices]
+        self.loop.call_soon(self.started.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*self.tasks, return_exceptions=True))
+            for device in self.devices:
+                device.close()
+            self.loop.close()
+
+    def publish(self) -> None:
+        '''
+        Merge every device's inputs into a new state. Runs on the hub's loop whenever one changes.
+        '''
+        states = [device.state for device in self.devices if device.state is not None]
+        self.frame += 1
+        if states:
+            self.state = InputState.merge(states, self.frame)
+        else:
+            # Every device dropped. Stamp it, so whatever got let go gets let go now.
+            self.state = InputState.neutral(time.perf_counter_ns(), self.frame)
+        if self.notify is not None:
+            self.notify()
+
+    def sendOutput(self, lamps: tuple) -> None:
+        '''
+        Send lamp states, a bitmask per player, to every connected device. Safe from any thread.
+        '''
+        self.out_sequence = (self.out_sequence+1) & 0xFFFFFFFF
+        self.sendPacket(IOPacket.packOutput(self.out_sequence, lamps))
+
+    def sendPacket(self, data: bytes) -> None:
+        '''
+        Send an already-built packet to every connected device. Safe from any thread.
+        '''
+        if self.loop is None:
+            return
+        for device in self.devices:
+            self.loop.call_soon_threadsafe(device.queueOutput, data)
+
+    def shutdown(self) -> None:
+        '''
+        Disconnect every device and stop the hub's thread, logging how they did.
+        '''
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+        # The loop's closed now, so outputs sent after this get dropped instead of raising.
+        self.loop = None
+        for device in self.devices:
+            self.log(f'{device.name}: {device.packets} packets, {device.stale} stale, {device.timeouts} timeouts, {device.reconnects} reconnects, {device.dropped_outputs} dropped outputs.')
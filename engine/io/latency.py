@@ -0,0 +1,163 @@
+import threading, time
+from array import array
+
+from engine.common.constants import LogConstants
+from engine.common.logger import LogManager
+
+class LatencyHistogram:
+    '''
+    Fixed bucket histogram of times. Adding one is an index and an increment, so it's
+    fine to do per input. Anything past the last bucket lands in it.
+    '''
+
+    def __init__(self, bucket_us: int = 10, max_ms: int = 100) -> None:
+        self.bucket_ns = bucket_us*1000
+        self.buckets = array('L', [0]*(max_ms*1000//bucket_us+1))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns: int) -> None:
+        if ns < 0:
+            ns = 0
+        self.buckets[min(ns//self.bucket_ns, len(self.buckets)-1)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def reset(self) -> None:
+        self.buckets = array('L', [0]*len(self.buckets))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def percentiles(self, pcts: list) -> list:
+        '''
+        Given percentiles (0-100, ascending), return the nearest-rank time of each in ms.
+        '''
+        out = []
+        if not self.count:
+            return [0.0]*len(pcts)
+        ranks = [max(1, int(round(pct/100*self.count))) for pct in pcts]
+        seen = 0
+        rank = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            while rank < len(ranks) and seen >= ranks[rank]:
+                out.append(round((index+1)*self.bucket_ns/1e6, 3))
+                rank += 1
+            if rank == len(ranks):
+                break
+        return out
+
+    def summary(self) -> dict:
+        '''
+        Return count and avg/p50/p95/p99/max in ms.
+        '''
+        p50, p95, p99 = self.percentiles([50, 95, 99])
+        return {
+            'count': self.count,
+            'avg': round(self.total/self.count/1e6, 3) if self.count else 0.0,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'max': round(self.max/1e6, 3)
+        }
+
+class LatencyTracker:
+    '''
+    Times every input edge through the engine: when its packet came in, when game logic
+    read it, and when the frame after that finished presenting. Those get kept as
+    histograms, along with how long new inputs took to get polled, for checking an IO chain.
+
+        - receive_to_poll: from a packet coming in to the poller picking it up.
+        - receive_to_consume: how long edges waited on game logic.
+        - consume_to_present: from game logic reading an edge to its frame being on screen.
+        - receive_to_present: the whole way, input to screen.
+
+    polled runs on the poller's thread, everything else on the main one, so polled, reset
+    and summary share a lock.
+    '''
+    stages = ['receive_to_poll', 'receive_to_consume', 'consume_to_present', 'receive_to_present']
+    max_pending = 1024 # Edges waiting on a present. Past this, nobody's presenting, so stop adding.
+
+    def __init__(self) -> None:
+        self.histograms = {stage: LatencyHistogram() for stage in self.stages}
+        self.pending = [] # (received, consumed) of edges read since the last present.
+        self.polls = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def polled(self, delay: int = None) -> None:
+        '''
+        Record a poll, and if it picked up new inputs, how long ago in ns they came in.
+        Run by the poller.
+        '''
+        with self.lock:
+            self.polls += 1
+            if delay is not None:
+                self.histograms['receive_to_poll'].add(delay)
+
+    def consumed(self, events: list, now: int = None) -> None:
+        '''
+        Given edges game logic just read, record how long they waited.
+        '''
+        if not events:
+            return
+        now = time.perf_counter_ns() if now is None else now
+        histogram = self.histograms['receive_to_consume']
+        for event in events:
+            histogram.add(now-event[0])
+            if len(self.pending) < self.max_pending:
+                self.pending.append((event[0], now))
+
+    def presented(self, now: int = None) -> None:
+        '''
+        Record that everything read so far is on screen. Run once display.update returns.
+        '''
+        if not self.pending:
+            return
+        now = time.perf_counter_ns() if now is None else now
+        consume_to_present = self.histograms['consume_to_present']
+        receive_to_present = self.histograms['receive_to_present']
+        for received, consumed in self.pending:
+            consume_to_present.add(now-consumed)
+            receive_to_present.add(now-received)
+        self.pending.clear()
+
+    def pollRate(self) -> float:
+        '''
+        Return polls a second since the last reset.
+        '''
+        taken = time.perf_counter()-self.started
+        return self.polls/taken if taken > 0 else 0.0
+
+    def summary(self) -> dict:
+        '''
+        Return every histogram's summary, plus the poll rate and jitter (p99 receive to poll
+        past the p50), in ms.
+        '''
+        with self.lock:
+            out = {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+            out['poll_rate'] = round(self.pollRate(), 1)
+        out['poll_jitter'] = round(out['receive_to_poll']['p99']-out['receive_to_poll']['p50'], 3)
+        return out
+
+    def reset(self) -> None:
+        with self.lock:
+            for histogram in self.histograms.values():
+                histogram.reset()
+            self.pending.clear()
+            self.polls = 0
+            self.started = time.perf_counter()
+
+    def dumpToLog(self, logger: LogManager) -> None:
+        '''
+        Write the current summary to the engine log.
+        '''
+        summary = self.summary()
+        logger.writeLogEntry(f"Input polling at {summary['poll_rate']}Hz, {summary['poll_jitter']}ms jitter.", LogConstants.STATUS_OK_CYAN, tool="PROFILER")
+        for stage in self.stages:
+            stage_ms = summary[stage]
+            logger.writeLogEntry(f"Input {stage.replace('_', ' ')} over {stage_ms['count']} inputs: p50 {stage_ms['p50']}ms, p95 {stage_ms['p95']}ms, p99 {stage_ms['p99']}ms, max {stage_ms['max']}ms.", LogConstants.STATUS_OK_CYAN, tool="PROFILER")
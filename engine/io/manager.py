@@ -0,0 +1,193 @@
+import selectors, socket, threading, time
+
+from engine.common.constants import LogConstants
+from engine.common.logger import LogManager
+from engine.common.validated import ValidatedDict
+from engine.io.protocol import InputState, IOPacket
+
+class IOManager:
+    '''
+    The IO socket. IO boards send input packets to it over UDP, and it sends lamp outputs
+    back to them. See engine/io/README.md for the packet layouts.
+
+    Packets get read and unpacked on the manager's own thread as soon as they land, and
+    the newest inputs are published as one InputState. The game just reads state once a
+    frame, which is a plain attribute read, so there's no parsing or locking on the
+    render thread.
+
+    notify, if set, gets run on the IO thread after every new state, so whatever reads
+    state can sleep until there's something to read.
+
+    Once every board has gone quiet for peer_timeout, the inputs get let go, so a board
+    that dies mid-press doesn't leave a button held.
+    '''
+    peer_timeout = 1.0 # Seconds without a packet before a board counts as gone.
+
+    def __init__(self, inputs_config: ValidatedDict, logger: LogManager) -> None:
+        self.logger = logger
+        self.port = inputs_config.get_int('connect_port', 59585)
+        self.address = inputs_config.get_str('bind_address', '127.0.0.1')
+
+        self.state = InputState.neutral()
+        self.peers = {} # Address: (last sequence, last seen).
+        self.out_sequence = 0
+        self.notify = None
+
+        # Stats.
+        self.packets = 0
+        self.stale = 0
+        self.malformed = 0
+
+        self.sock = None
+        self.thread = None
+        self.running = False
+        self.buffer = bytearray(2048)
+
+    def start(self) -> bool:
+        '''
+        Open the socket and start the IO thread.
+
+        Returns: False if the socket couldn't be opened, the engine carries on without IO.
+        '''
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.bind((self.address, self.port))
+        except OSError as e:
+            self.logger.writeLogEntry(f"Couldn't open the IO socket on {self.address}:{self.port}: {e}", LogConstants.STATUS_WARNING, tool="IO_MGR")
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+            return False
+        self.sock.setblocking(False)
+
+        # Something to wake the thread up with when it's time to stop.
+        self.wake_recv, self.wake_send = socket.socketpair()
+        self.wake_recv.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ, self.receive)
+        self.selector.register(self.wake_recv, selectors.EVENT_READ, None)
+
+        self.running = True
+        self.thread = threading.Thread(target=self.ioLoop, name='IOManager', daemon=True)
+        self.thread.start()
+        self.logger.writeLogEntry(f'IO manager listening on {self.address}:{self.port}.', LogConstants.STATUS_OK_BLUE, tool="IO_MGR")
+        return True
+
+    def ioLoop(self) -> None:
+        '''
+        Main loop of the IO thread. Sleeps until there's a packet or we're stopping, waking
+        up now and then to check for boards that went quiet.
+        '''
+        while self.running:
+            for key, mask in self.selector.select(self.peer_timeout/4):
+                if key.data is not None:
+                    key.data()
+            self.expire()
+
+    def expire(self) -> None:
+        '''
+        Let go of the inputs once no board has sent anything for peer_timeout.
+        '''
+        if not self.state.received or (not any(self.state.buttons) and not any(self.state.axes)):
+            return
+        now = time.perf_counter_ns()
+        if all(now-seen >= self.peer_timeout*1e9 for sequence, seen in self.peers.values()):
+            self.state = InputState.neutral(now, self.state.sequence)
+            if self.notify is not None:
+                self.notify()
+            self.logger.writeLogEntry('Every IO board went quiet, letting go of their inputs.', LogConstants.STATUS_WARNING, tool="IO_MGR")
+
+    def receive(self) -> None:
+        '''
+        Read every packet waiting on the socket.
+        '''
+        packet = IOPacket.input
+        while True:
+            try:
+                size, peer = self.sock.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionResetError:
+                # Windows reports a board going away as an error on the next read. Reading
+                # it clears it, so carry on with the rest.
+                continue
+            except OSError as e:
+                # Anything else won't clear by reading again, so stop listening instead of
+                # spinning on it. The thread keeps running to let go of held inputs.
+                self.logger.writeLogEntry(f"IO socket failed, not reading inputs anymore: {e}", LogConstants.STATUS_WARNING, tool="IO_MGR")
+                try:
+                    self.selector.unregister(self.sock)
+                except (KeyError, ValueError):
+                    pass
+                return
+            received = time.perf_counter_ns()
+
+            if size != packet.size:
+                self.malformed += 1
+                continue
+            fields = packet.unpack_from(self.buffer)
+            if fields[0] != IOPacket.magic or fields[1] != IOPacket.version or fields[2] != IOPacket.KIND_INPUT:
+                self.malformed += 1
+                continue
+
+            # Drop anything older than what we've got, unless the board went quiet and restarted.
+            sequence = fields[3]
+            last = self.peers.get(peer)
+            if last is not None and not IOPacket.newer(sequence, last[0]) and received-last[1] < self.peer_timeout*1e9:
+                self.stale += 1
+                continue
+            self.peers[peer] = (sequence, received)
+            self.packets += 1
+
+            self.state = InputState(sequence, fields[4], received, fields[5:5+IOPacket.players], fields[5+IOPacket.players:])
+            if self.notify is not None:
+                self.notify()
+
+    def sendOutput(self, lamps: tuple) -> int:
+        '''
+        Send lamp states, a bitmask per player, to every board we've heard from lately.
+
+        Returns: How many boards it went to.
+        '''
+        self.out_sequence = (self.out_sequence+1) & 0xFFFFFFFF
+        return self.sendPacket(IOPacket.packOutput(self.out_sequence, lamps))
+
+    def sendPacket(self, data: bytes) -> int:
+        '''
+        Send an already-built packet to every board we've heard from lately.
+
+        Returns: How many boards it went to.
+        '''
+        if self.sock is None:
+            return 0
+
+        now = time.perf_counter_ns()
+        sent = 0
+        for peer, (sequence, seen) in list(self.peers.items()):
+            if now-seen >= self.peer_timeout*1e9:
+                continue
+            try:
+                self.sock.sendto(data, peer)
+                sent += 1
+            except OSError:
+                pass
+        return sent
+
+    def shutdown(self) -> None:
+        '''
+        Stop the IO thread and close the socket, logging what came in.
+        '''
+        if self.thread is None:
+            return
+
+        self.running = False
+        self.wake_send.send(b'\0')
+        self.thread.join()
+        self.thread = None
+        self.selector.close()
+        self.sock.close()
+        self.sock = None
+        self.wake_recv.close()
+        self.wake_send.close()
+        self.logger.writeLogEntry(f'IO manager got {self.packets} packets from {len(self.peers)} boards, {self.stale} stale, {self.malformed} malformed.', LogConstants.STATUS_OK_BLUE, tool="IO_MGR")
@@ -0,0 +1,137 @@
+import time
+
+from engine.io.protocol import IOPacket
+
+class OutputChannel:
+    '''
+    Lamp and LED state for the IO boards, as a block of bytes. Game code sets it as
+    often as it likes during a frame, which only touches memory. At the end of the frame,
+    flush sends whatever bytes changed since the last packet, as one diff packet, so a
+    frame costs at most one packet however many updates went into it, and nothing if
+    nothing changed.
+
+    Packets go out at most max_rate times a second, anything set in between gets picked
+    up by the next one. Every keyframe_interval seconds the whole state goes out instead,
+    so a board that lost a packet or restarted catches up.
+    '''
+    run_gap = 3 # Changed bytes this close together go in one run. A run header costs 3 bytes.
+    rate_slack = 0.001 # Frames don't land exactly on time, so let packets go out this early.
+
+    def __init__(self, send, size: int = 64, max_rate: int = 60, keyframe_interval: float = 1.0) -> None:
+        self.send = send # Takes a packet's bytes.
+        self.state = bytearray(size)
+        self.sent = bytearray(size) # What the boards should have.
+        self.min_interval = 1.0/max_rate if max_rate > 0 else 0.0
+        self.keyframe_interval = keyframe_interval
+
+        self.sequence = 0
+        self.last_send = 0.0
+        self.last_keyframe = None
+
+        # Stats.
+        self.updates = 0
+        self.packets = 0
+        self.keyframes = 0
+        self.bytes_sent = 0
+
+    def __len__(self) -> int:
+        return len(self.state)
+
+    def __getitem__(self, index: int) -> int:
+        return self.state[index]
+
+    def __setitem__(self, index: int, value: int) -> None:
+        self.state[index] = value
+        self.updates += 1
+
+    def setBytes(self, offset: int, data: bytes) -> None:
+        '''
+        Set a run of bytes, like an LED strip's colors.
+        '''
+        self.state[offset:offset+len(data)] = data
+        self.updates += 1
+
+    def setLamp(self, index: int, on: bool) -> None:
+        '''
+        Set one bit, for plain on/off lamps. Lamp n is bit n%8 of byte n//8.
+        '''
+        if on:
+            self.state[index >> 3] |= 1 << (index & 7)
+        else:
+            self.state[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+        self.updates += 1
+
+    def changedRuns(self) -> list:
+        '''
+        Return (offset, length) runs of bytes that changed since the last packet.
+        '''
+        runs = []
+        state = self.state
+        sent = self.sent
+        start = None
+        end = 0
+        for index in range(len(state)):
+            if state[index] == sent[index]:
+                continue
+            if start is not None and index-end <= self.run_gap and index-start < 255:
+                end = index+1
+                continue
+            if start is not None:
+                runs.append((start, end-start))
+            start = index
+            end = index+1
+        if start is not None:
+            runs.append((start, end-start))
+        return runs
+
+    def flush(self, now: float = None) -> bool:
+        '''
+        Send whatever changed this frame. Run once at the end of every frame.
+
+        Returns: True if a packet went out.
+        '''
+        now = time.perf_counter() if now is None else now
+        if now-self.last_send < self.min_interval-self.rate_slack:
+            return False
+
+        if self.last_keyframe is None or now-self.last_keyframe >= self.keyframe_interval:
+            return self.sendKeyframe(now)
+
+        # Nothing changed, nothing to send. Comparing the whole thing at once is cheap.
+        if self.state == self.sent:
+            return False
+
+        runs = self.changedRuns()
+        base = self.sequence
+        self.sequence = (self.sequence+1) & 0xFFFFFFFF
+        data = IOPacket.packDiff(self.sequence, base, self.state, runs)
+        if len(data) >= IOPacket.keyframe.size+len(self.state):
+            # Most of it changed, the whole thing is smaller.
+            self.sequence = base
+            return self.sendKeyframe(now)
+
+        self.sent[:] = self.state
+        self.transmit(data, now)
+        return True
+
+    def sendKeyframe(self, now: float) -> bool:
+        self.sequence = (self.sequence+1) & 0xFFFFFFFF
+        self.sent[:] = self.state
+        self.transmit(IOPacket.packKeyframe(self.sequence, self.state), now)
+        self.last_keyframe = now
+        self.keyframes += 1
+        return True
+
+    def transmit(self, data: bytes, now: float) -> None:
+        self.send(data)
+        self.last_send = now
+        self.packets += 1
+        self.bytes_sent += len(data)
+
+    def stats(self) -> dict:
+        return {
+            'updates': self.updates,
+            'packets': self.packets,
+            'keyframes': self.keyframes,
+            'bytes_sent': self.bytes_sent
+        }
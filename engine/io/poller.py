@@ -0,0 +1,223 @@
+import threading, time
+from array import array
+
+from pygame import key
+
+from engine.common.constants import LogConstants
+from engine.common.logger import LogManager
+from engine.common.validated import ValidatedDict
+from engine.io.latency import LatencyTracker
+from engine.io.protocol import InputState, IOPacket
+
+class InputBindings:
+    '''
+    bindings.json, compiled down to lookup tables. Every action gets a number, and each
+    player's IO buttons become a list from button bit to action number, so turning an
+    input into an action is one index instead of a dict lookup and some string work.
+
+    A player that isn't bound gets button n as action `buttonN`. Bound players can
+    rename buttons and add keyboard keys, by pygame key name:
+
+        "player1": {"bound": true, "buttons": {"0": "start"}, "keys": {"return": "start"}}
+    '''
+    players = ['player1', 'player2']
+
+    def __init__(self, bindings: ValidatedDict, logger: LogManager) -> None:
+        self.actions = [f'button{bit}' for bit in range(32)]
+        self.action_ids = {name: index for index, name in enumerate(self.actions)}
+        self.buttons = [] # Per player, button bit to action number.
+        self.keys = {} # Pygame key code to (player, action number).
+
+        for player, player_name in enumerate(self.players):
+            table = array('h', range(32))
+            conf = bindings.get_dict(player_name)
+            if conf.get_bool('bound'):
+                for bit, action in conf.get_dict('buttons').items():
+                    if not str(bit).isdigit() or int(bit) >= 32:
+                        logger.writeLogEntry(f"Can't bind {player_name} button {bit}, there's only 0-31.", LogConstants.STATUS_WARNING, tool="INPUT")
+                        continue
+                    table[int(bit)] = self.actionId(action)
+                for key_name, action in conf.get_dict('keys').items():
+                    try:
+                        key_code = key.key_code(key_name)
+                    except ValueError:
+                        logger.writeLogEntry(f"Can't bind {player_name} to unknown key {key_name}.", LogConstants.STATUS_WARNING, tool="INPUT")
+                        continue
+                    self.keys[key_code] = (player, self.actionId(action))
+            self.buttons.append(table)
+
+    def actionId(self, name: str) -> int:
+        '''
+        Given an action name, return its number, adding it if it's new.
+        '''
+        action = self.action_ids.get(name)
+        if action is None:
+            action = self.action_ids[name] = len(self.actions)
+            self.actions.append(name)
+        return action
+
+class InputPoller:
+    '''
+    Watches the IO sources on its own thread, and records every button press and release
+    into a ring buffer with when it happened. IO board edges are stamped with when their
+    packet came in, not when they got polled, so they're good to well under a frame.
+    Keyboard edges come in from the main thread through push.
+
+    The thread sleeps until a source's notify wakes it, so it only takes the GIL off the
+    game when there's actually a new state to look at. It also checks poll_rate times a
+    second regardless, for sources that can't wake it. With no sources it doesn't run at all.
+
+    Game logic reads the buffer each tick with read, getting only what happened up to
+    that tick, so fast inputs land on the tick they belong to. If nobody reads for a
+    while, the oldest edges get overwritten and counted as overruns.
+
+    Edges are (time in perf_counter_ns, player, action number, pressed). How long they
+    take to get read and shown is tracked in latency.
+    '''
+
+    def __init__(self, sources: list, bindings: InputBindings, poll_rate: int = 100, size: int = 1024) -> None:
+        self.sources = sources # Anything with a state attribute holding an InputState, and optionally notify.
+        self.bindings = bindings
+        self.period = 1.0/max(1, poll_rate)
+
+        # The ring buffer, all allocated up front.
+        self.size = size
+        self.times = array('q', [0]*size)
+        self.players = array('B', [0]*size)
+        self.codes = array('h', [0]*size)
+        self.pressed = array('B', [0]*size)
+        self.written = 0 # Edges ever written. The next one goes at written % size.
+        self.read_to = 0 # Edges ever read.
+        self.lock = threading.Lock()
+
+        self.last_states = [None]*len(sources)
+        self.held = [0]*IOPacket.players
+
+        # Stats.
+        self.polls = 0
+        self.overruns = 0
+        self.poll_started = 0.0
+        self.latency = LatencyTracker()
+
+        self.wake = threading.Event()
+        self.thread = None
+        self.running = False
+
+    def start(self) -> bool:
+        '''
+        Start the poller thread, if there's anything to poll.
+
+        Returns: False if there were no sources, keyboard edges still get recorded.
+        '''
+        if not self.sources:
+            return False
+        for source in self.sources:
+            if hasattr(source, 'notify'):
+                source.notify = self.wake.set
+        self.running = True
+        self.poll_started = time.perf_counter()
+        self.thread = threading.Thread(target=self.pollLoop, name='InputPoller', daemon=True)
+        self.thread.start()
+        return True
+
+    def pollLoop(self) -> None:
+        '''
+        Main loop of the poller thread. Sleeps until a source has something new, or the
+        backstop period is up.
+        '''
+        while self.running:
+            self.wake.wait(self.period)
+            # Clear before polling, so a state published mid-poll wakes us again.
+            self.wake.clear()
+            self.poll()
+
+    def poll(self) -> None:
+        '''
+        Check every source for new inputs, recording any buttons that changed.
+        '''
+        self.polls += 1
+        now = time.perf_counter_ns()
+        delay = None
+        for index, source in enumerate(self.sources):
+            state = source.state
+            if state is self.last_states[index]:
+                continue
+            self.last_states[index] = state
+            if state.received:
+                delay = max(delay or 0, now-state.received)
+
+            buttons = InputState.merge([last for last in self.last_states if last is not None]).buttons if len(self.sources) > 1 else state.buttons
+            for player, mask in enumerate(buttons):
+                changed = mask ^ self.held[player]
+                if not changed:
+                    continue
+                self.held[player] = mask
+                table = self.bindings.buttons[player]
+                # Inputs that never came in a packet have no time of their own, so use now.
+                when = state.received or time.perf_counter_ns()
+                while changed:
+                    bit = (changed & -changed).bit_length()-1
+                    changed &= changed-1
+                    self.push(when, player, table[bit], mask >> bit & 1)
+        self.latency.polled(delay)
+
+    def push(self, when: int, player: int, action: int, pressed: bool) -> None:
+        '''
+        Record an edge. Safe from any thread.
+        '''
+        with self.lock:
+            slot = self.written % self.size
+            self.times[slot] = when
+            self.players[slot] = player
+            self.codes[slot] = action
+            self.pressed[slot] = pressed
+            self.written += 1
+
+    def pushKey(self, key_code: int, pressed: bool) -> bool:
+        '''
+        Given a pygame key event's key, record it if it's bound. Run from the event handler.
+
+        Returns: True if the key was bound.
+        '''
+        binding = self.bindings.keys.get(key_code)
+        if binding is None:
+            return False
+        self.push(time.perf_counter_ns(), binding[0], binding[1], pressed)
+        return True
+
+    def read(self, until: int = None) -> list:
+        '''
+        Return every edge up to until (perf_counter_ns, or everything without one) that
+        hasn't been read yet, oldest first.
+        '''
+        with self.lock:
+            written = self.written
+        if written-self.read_to > self.size:
+            self.overruns += written-self.read_to-self.size
+            self.read_to = written-self.size
+
+        out = []
+        while self.read_to < written:
+            slot = self.read_to % self.size
+            when = self.times[slot]
+            if until is not None and when > until:
+                break
+            out.append((when, self.players[slot], self.codes[slot], bool(self.pressed[slot])))
+            self.read_to += 1
+        self.latency.consumed(out)
+        return out
+
+    def pollRate(self) -> float:
+        '''
+        Return how many times a second the thread has actually polled.
+        '''
+        taken = time.perf_counter()-self.poll_started
+        return self.polls/taken if taken > 0 else 0.0
+
+    def shutdown(self) -> None:
+        if self.thread is None:
+            return
+        self.running = False
+        self.wake.set()
+        self.thread.join()
+        self.thread = None
@@ -0,0 +1,169 @@
+import struct, time
+
+class InputState:
+    '''
+    One IO board's inputs at one moment. Never changed once made, a new one gets swapped
+    in whenever a packet comes in, so reading it from another thread needs no lock.
+
+    buttons is a bitmask per player, bit n being button n. axes are the analog inputs,
+    -32768 to 32767. timestamp is the board's own clock in microseconds, received is ours,
+    from time.perf_counter_ns.
+    '''
+    __slots__ = ('sequence', 'timestamp', 'received', 'buttons', 'axes')
+
+    def __init__(self, sequence: int, timestamp: int, received: int, buttons: tuple, axes: tuple) -> None:
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.received = received
+        self.buttons = buttons
+        self.axes = axes
+
+    def pressed(self, player: int, button: int) -> bool:
+        '''
+        Given a player (0 or 1) and a button number, return if it's held.
+        '''
+        return bool(self.buttons[player] >> button & 1)
+
+    def axis(self, index: int) -> float:
+        '''
+        Given an axis number, return it from -1.0 to 1.0.
+        '''
+        return max(-1.0, self.axes[index]/32767)
+
+    @classmethod
+    def neutral(self, received: int = 0, sequence: int = 0) -> 'InputState':
+        '''
+        Return inputs with nothing held and every axis centered. received is when the
+        inputs got let go, for a board that went away.
+        '''
+        return self(sequence, 0, received, (0,)*IOPacket.players, (0,)*IOPacket.axes)
+
+    @classmethod
+    def merge(self, states: list, sequence: int = 0) -> 'InputState':
+        '''
+        Given inputs from several boards, return them as one. Buttons held on any board are
+        held, and each axis comes from whichever board has it furthest from center.
+        '''
+        states = [state for state in states if state.received]
+        if len(states) == 1:
+            return states[0]
+        if not states:
+            return self.neutral(0, sequence)
+
+        buttons = [0]*IOPacket.players
+        axes = [0]*IOPacket.axes
+        for state in states:
+            for index, mask in enumerate(state.buttons):
+                buttons[index] |= mask
+            for index, value in enumerate(state.axes):
+                if abs(value) > abs(axes[index]):
+                    axes[index] = value
+        newest = max(states, key=lambda state: state.received)
+        return self(sequence or newest.sequence, newest.timestamp, newest.received, tuple(buttons), tuple(axes))
+
+class IOPacket:
+    '''
+    The datagrams sent over the IO socket. Fixed layouts, little endian, so reading one
+    is a single unpack:
+
+        header: magic, version, kind, sequence, timestamp (sender's clock, microseconds)
+        input:  header, a 32 bit button mask per player, then 8 signed 16 bit axes
+        output: header, a 32 bit lamp mask per player
+        output keyframe: header, 16 bit length, then every output byte
+        output diff: header, 32 bit sequence it's a diff from, 16 bit run count, then per
+            run a 16 bit offset, 8 bit length, and the new bytes
+
+    Sequence numbers are per sender and wrap at 2^32. Anything not newer than the last
+    one seen from that sender is old and gets dropped.
+    '''
+    magic = b'BI'
+    version = 1
+    players = 2
+    axes = 8
+
+    KIND_INPUT = 1
+    KIND_OUTPUT = 2
+    KIND_OUTPUT_DIFF = 3
+    KIND_OUTPUT_KEYFRAME = 4
+
+    header = struct.Struct('<2sBBIQ')
+    input = struct.Struct(f'<2sBBIQ{players}I{axes}h')
+    output = struct.Struct(f'<2sBBIQ{players}I')
+    keyframe = struct.Struct('<2sBBIQH')
+    diff = struct.Struct('<2sBBIQIH')
+    run = struct.Struct('<HB')
+
+    @classmethod
+    def timestamp(self) -> int:
+        return time.perf_counter_ns()//1000
+
+    @classmethod
+    def packInput(self, sequence: int, buttons: tuple, axes: tuple = (), timestamp: int = None) -> bytes:
+        '''
+        Build an input packet. For IO boards and anything else sending inputs.
+        '''
+        axes = tuple(axes)+(0,)*(self.axes-len(axes))
+        return self.input.pack(self.magic, self.version, self.KIND_INPUT, sequence & 0xFFFFFFFF, self.timestamp() if timestamp is None else timestamp, *buttons, *axes)
+
+    @classmethod
+    def packOutput(self, sequence: int, lamps: tuple, timestamp: int = None) -> bytes:
+        '''
+        Build an output packet, lamps being a bitmask per player.
+        '''
+        return self.output.pack(self.magic, self.version, self.KIND_OUTPUT, sequence & 0xFFFFFFFF, self.timestamp() if timestamp is None else timestamp, *lamps)
+
+    @classmethod
+    def packKeyframe(self, sequence: int, state: bytes, timestamp: int = None) -> bytes:
+        '''
+        Build an output keyframe, every output byte as it is.
+        '''
+        return self.keyframe.pack(self.magic, self.version, self.KIND_OUTPUT_KEYFRAME, sequence & 0xFFFFFFFF, self.timestamp() if timestamp is None else timestamp, len(state))+bytes(state)
+
+    @classmethod
+    def packDiff(self, sequence: int, base: int, state: bytes, runs: list, timestamp: int = None) -> bytes:
+        '''
+        Build an output diff from the packet numbered base, given (offset, length) runs of
+        state that changed. Runs can't be longer than 255.
+        '''
+        parts = [self.diff.pack(self.magic, self.version, self.KIND_OUTPUT_DIFF, sequence & 0xFFFFFFFF, self.timestamp() if timestamp is None else timestamp, base & 0xFFFFFFFF, len(runs))]
+        for offset, length in runs:
+            parts.append(self.run.pack(offset, length))
+            parts.append(state[offset:offset+length])
+        return b''.join(parts)
+
+    @classmethod
+    def applyOutput(self, state: bytearray, data: bytes, last: int = None) -> int:
+        '''
+        Given a receiver's output bytes, the packet and the sequence number of the last one
+        applied (None for none yet), apply it. Diffs only apply on top of the packet they
+        were made from, so after a lost packet, everything waits for the next keyframe.
+
+        Returns: The packet's sequence number if it got applied, otherwise last.
+        '''
+        magic, version, kind, sequence, timestamp = self.header.unpack_from(data)
+        if magic != self.magic or version != self.version:
+            return last
+        if kind == self.KIND_OUTPUT_KEYFRAME:
+            length = self.keyframe.unpack_from(data)[5]
+            state[:length] = data[self.keyframe.size:self.keyframe.size+length]
+            return sequence
+        if kind != self.KIND_OUTPUT_DIFF:
+            return last
+
+        base, count = self.diff.unpack_from(data)[5:]
+        if last is None or base != last:
+            return last
+        pos = self.diff.size
+        for run in range(count):
+            offset, length = self.run.unpack_from(data, pos)
+            pos += self.run.size
+            state[offset:offset+length] = data[pos:pos+length]
+            pos += length
+        return sequence
+
+    @classmethod
+    def newer(self, sequence: int, last: int) -> bool:
+        '''
+        Given two sequence numbers, return if the first comes after the second, allowing for wrapping.
+        '''
+        return 0 < (sequence-last) & 0xFFFFFFFF < 0x80000000
@@ -0,0 +1,220 @@
+# Offline query tool for structured logs.
+# Filters, counts and time-slices log.jsonl using its sidecar index, so only the blocks that matter get read.
+#
+# Examples:
+#   python -m engine.logquery count --tool ASSET_MGR --status F --since 1h
+#   python -m engine.logquery count --by tool pulled/cab3/log.jsonl
+#   python -m engine.logquery list --status W --since "2026-10-18 09:00" --until "2026-10-18 10:00"
+#   python -m engine.logquery index pulled/cab3/log.jsonl
+
+import argparse, os, re, sys, time
+from datetime import datetime
+
+from engine.common.constants import LogConstants
+from engine.common.logsink import LogBlock, StructuredLogSink
+
+STATUS_NAMES = {
+    'header': LogConstants.STATUS_HEADER,
+    'dbg': LogConstants.STATUS_OK_BLUE,
+    'debug': LogConstants.STATUS_OK_BLUE,
+    'cyan': LogConstants.STATUS_OK_CYAN,
+    'ok': LogConstants.STATUS_OK_GREEN,
+    'w': LogConstants.STATUS_WARNING,
+    'warning': LogConstants.STATUS_WARNING,
+    'f': LogConstants.STATUS_FAIL,
+    'fail': LogConstants.STATUS_FAIL
+}
+STATUS_LABELS = {
+    LogConstants.STATUS_HEADER: 'HEADER',
+    LogConstants.STATUS_OK_BLUE: 'DBG',
+    LogConstants.STATUS_OK_CYAN: 'CYAN',
+    LogConstants.STATUS_OK_GREEN: 'OK',
+    LogConstants.STATUS_WARNING: 'W',
+    LogConstants.STATUS_FAIL: 'F'
+}
+
+class LogQuery:
+    '''
+    Runs filters over a structured log. Whole blocks get counted straight from the
+    index when they can be, skipped when they can't match, and only read otherwise.
+    '''
+
+    def __init__(self, path: str, tools: list = None, statuses: list = None, grep: str = None) -> None:
+        self.path = path
+        self.tools = tools
+        self.statuses = statuses
+        self.grep = grep
+        self.since: float = None
+        self.until: float = None
+
+        self.blocks = StructuredLogSink.loadIndex(f"{path}.idx")
+        indexed_end = self.blocks[-1].offset+self.blocks[-1].length if self.blocks else 0
+        if indexed_end > os.path.getsize(path):
+            self.blocks = []
+            indexed_end = 0
+
+        # Whatever isn't indexed yet. Small unless the index is missing.
+        self.tail = LogBlock(indexed_end)
+        for record, length in StructuredLogSink.readRecords(path, indexed_end):
+            if record is None:
+                self.tail.length += length
+                continue
+            self.tail.add(record['t'], record['tool'], record['status'], length)
+
+    def endTime(self) -> float:
+        '''
+        Return the time of the newest record in the log.
+        '''
+        ends = [block.last for block in self.blocks+[self.tail] if block.last is not None]
+        return max(ends) if ends else time.time()
+
+    def setTimeRange(self, since: str = None, until: str = None) -> None:
+        '''
+        Given since/until strings, set the time slice. Relative times count back from
+        the newest record in the log, so pulled logs work the same as live ones.
+        '''
+        end = self.endTime()
+        self.since = LogQuery.parseTime(since, end) if since else None
+        self.until = LogQuery.parseTime(until, end) if until else None
+
+    @classmethod
+    def parseTime(self, value: str, end: float) -> float:
+        '''
+        Given '90s', '15m', '1h', '2d', an epoch, or an ISO date, return an epoch.
+        '''
+        relative = re.fullmatch(r'(\d+(?:\.\d+)?)([smhd])', value)
+        if relative:
+            return end - float(relative.group(1))*{'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[relative.group(2)]
+        try:
+            return float(value)
+        except ValueError:
+            return datetime.fromisoformat(value).timestamp()
+
+    def blockInRange(self, block: LogBlock) -> bool:
+        if block.first is None:
+            return False
+        if self.since is not None and block.last < self.since:
+            return False
+        if self.until is not None and block.first > self.until:
+            return False
+        return True
+
+    def blockFullyInRange(self, block: LogBlock) -> bool:
+        return (self.since is None or block.first >= self.since) and (self.until is None or block.last <= self.until)
+
+    def recordMatches(self, record: dict) -> bool:
+        if record is None:
+            return False
+        if self.tools and record['tool'] not in self.tools:
+            return False
+        if self.statuses and record['status'] not in self.statuses:
+            return False
+        if self.since is not None and record['t'] < self.since:
+            return False
+        if self.until is not None and record['t'] > self.until:
+            return False
+        if self.grep and self.grep not in record['msg']:
+            return False
+        return True
+
+    def records(self):
+        '''
+        Yield every matching record, in log order.
+        '''
+        for block in self.blocks+[self.tail]:
+            if not self.blockInRange(block) or block.count(self.tools, self.statuses) == 0:
+                continue
+            for record, length in StructuredLogSink.readRecords(self.path, block.offset, block.length):
+                if self.recordMatches(record):
+                    yield record
+
+    def count(self, by: str = None) -> dict:
+        '''
+        Count matching records, optionally grouped by 'tool' or 'status'.
+        '''
+        counts = {}
+        for block in self.blocks+[self.tail]:
+            if not self.blockInRange(block) or block.count(self.tools, self.statuses) == 0:
+                continue
+
+            if self.blockFullyInRange(block) and not self.grep:
+                # Answer straight from the index.
+                for tool, tool_counts in block.counts.items():
+                    if self.tools and tool not in self.tools:
+                        continue
+                    for status, count in tool_counts.items():
+                        if self.statuses and status not in self.statuses:
+                            continue
+                        key = LogQuery.groupKey(by, tool, status)
+                        counts[key] = counts.get(key, 0) + count
+                continue
+
+            for record, length in StructuredLogSink.readRecords(self.path, block.offset, block.length):
+                if self.recordMatches(record):
+                    key = LogQuery.groupKey(by, record['tool'], record['status'])
+                    counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    @classmethod
+    def groupKey(self, by: str, tool: str, status: int) -> str:
+        if by == 'tool':
+            return tool
+        if by == 'status':
+            return STATUS_LABELS.get(status, str(status))
+        return 'total'
+
+    @classmethod
+    def parseStatus(self, value: str) -> int:
+        '''
+        Given a status name like 'F' or 'warning', or a number, return the status code.
+        '''
+        if value.isdigit():
+            return int(value)
+        if value.lower() not in STATUS_NAMES:
+            raise argparse.ArgumentTypeError(f"Unknown status {value}! Use one of {', '.join(STATUS_NAMES)} or a number.")
+        return STATUS_NAMES[value.lower()]
+
+    @classmethod
+    def rebuildIndex(self, path: str) -> int:
+        '''
+        Throw away the sidecar index of a structured log and build it again. Returns the block count.
+        '''
+        if os.path.exists(f"{path}.idx"):
+            os.remove(f"{path}.idx")
+        sink = StructuredLogSink(path)
+        sink.close()
+        return len(StructuredLogSink.loadIndex(sink.index_path))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query a structured BasedEngine log.")
+    parser.add_argument('command', help="'count' matching entries, 'list' them, or rebuild the 'index'.", choices=['count', 'list', 'index'])
+    parser.add_argument('path', help="Structured log to read.", nargs='?', default=LogConstants.STRUCTURED_LOGFILE)
+    parser.add_argument('-t', '--tool', help="Only entries from this tool, like ASSET_MGR. Can be given more than once.", action='append')
+    parser.add_argument('-s', '--status', help="Only entries with this status, like F, W, DBG. Can be given more than once.", action='append', type=LogQuery.parseStatus)
+    parser.add_argument('--since', help="Start of the time slice. '1h' style times count back from the newest entry.")
+    parser.add_argument('--until', help="End of the time slice. Same format as --since.")
+    parser.add_argument('-g', '--grep', help="Only entries with this text in the message.")
+    parser.add_argument('--by', help="Group counts by tool or status.", choices=['tool', 'status'])
+    args = parser.parse_intermixed_args()
+
+    if not os.path.exists(args.path):
+        print(f"Couldn't find {args.path}!", file=sys.stderr)
+        exit(1)
+
+    if args.command == 'index':
+        print(f"Indexed {LogQuery.rebuildIndex(args.path)} blocks.")
+        exit()
+
+    query = LogQuery(args.path, args.tool, args.status, args.grep)
+    query.setTimeRange(args.since, args.until)
+
+    if args.command == 'count':
+        counts = query.count(args.by)
+        if args.by:
+            for key, count in sorted(counts.items()):
+                print(f"{key}\t{count}")
+        else:
+            print(counts.get('total', 0))
+    else:
+        for record in query.records():
+            print(LogConstants.formatEntry((record['t'], record['tool'], record['status'], record['msg'])))
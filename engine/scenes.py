@@ -0,0 +1,152 @@
+# Engine scenes.
+# The screens the engine shows on its own, before and after the game: the logo, loading and waiting.
+# The fades between them are transitions, see engine/common/transition.py.
+
+import pygame
+
+from engine.common.scene import Scene
+from engine.common.transition import Transition
+
+class LogoTransition(Transition):
+    '''
+    The logo's own fades, frame for frame as they always looked. Fading in, the background
+    brightens from 160 to 209 while the logo comes up from 115 alpha and slides up into
+    place. Fading out, the background darkens from 160 while the logo fades away and
+    slides down.
+
+    Draws everything itself, so the old and new screens only matter for the frame it
+    settles on. It's a fill and one blit, so it draws live every frame instead of
+    caching, which keeps every tick of it, interpolated between ticks like it always was.
+    '''
+    precomputed = False
+    frames_in = 50 # At 60 a second, whatever the tick rate.
+    frames_out = 55
+
+    def __init__(self, engine, fade_in: bool = True) -> None:
+        self.span = self.frames_in if fade_in else self.frames_out
+        Transition.__init__(self, self.span/60)
+        self.engine = engine
+        self.direction = 1 if fade_in else -1
+        self.logo = None
+
+    def begin(self, start: pygame.Surface, end: pygame.Surface) -> None:
+        Transition.begin(self, start, end)
+        self.logo = self.engine.loadScaledImage('logo.png').copy()
+        self.logo_x = (self.engine.resolution[0]-self.logo.get_width())/2
+
+    def drawStep(self, target: pygame.Surface, t: float) -> None:
+        i = (self.span-1)*t
+        shade = 160+self.direction*int(i)
+        target.fill((shade, shade, shade))
+
+        self.logo.set_alpha(max(0, 115+self.direction*int(i*2)))
+        target.blit(self.logo, (self.logo_x, self.engine.scaleValue(60-self.direction*i)))
+
+    def finish(self) -> None:
+        Transition.finish(self)
+        self.logo = None
+
+class LogoScene(Scene):
+    '''
+    The logo on the background. Drawn once, since nothing on it moves.
+    '''
+    images = ['logo.png']
+
+    def enter(self, previous: Scene) -> None:
+        self.drawn = False
+
+    def drawLogo(self, screen) -> None:
+        if self.drawn:
+            return
+        # The scaled logo's shared with the transitions, so fade a copy of it
+        logo = self.engine.loadScaledImage('logo.png').copy()
+        screen.fill((209, 209, 209))
+        logo.set_alpha(213)
+        screen.blit(logo, ((self.engine.resolution[0]-logo.get_width())/2, self.engine.scaleValue(11)))
+        self.engine.renderer.markAll()
+        self.drawn = True
+
+    def render(self, screen) -> None:
+        self.drawLogo(screen)
+
+class LogoInScene(LogoScene):
+    '''
+    The logo, faded in with LogoTransition and the jingle. Once the fade's done, on to
+    loading.
+    '''
+    name = 'LOGO_IN'
+    caption = '(loading...)'
+    sounds = ['jingle.wav']
+
+    def enter(self, previous: Scene) -> None:
+        LogoScene.enter(self, previous)
+
+        # Start by playing the jingle. Check the args.
+        if not self.engine.args.no_jingle:
+            self.engine.playSfx('jingle.wav')
+
+    def update(self) -> None:
+        # Only gets ticks once the fade in is over.
+        self.engine.scenes.switch('WAITING' if self.engine.loader.isDone() else 'LOADING')
+
+class LoadingScene(LogoScene):
+    '''
+    The logo, plus a progress bar, until the loader's done. Only the bar gets redrawn
+    once the screen is up.
+    '''
+    name = 'LOADING'
+    caption = '(loading...)'
+
+    def update(self) -> None:
+        if self.engine.loader.isDone():
+            self.engine.scenes.switch('WAITING')
+
+    def render(self, screen) -> None:
+        resolution = self.engine.resolution
+        bar_width = resolution[0]/3
+        bar_height = self.engine.scaleValue(12)
+        bar_x = (resolution[0]-bar_width)/2
+        bar_y = resolution[1]-self.engine.scaleValue(80)
+
+        if not self.drawn:
+            self.drawLogo(screen)
+            pygame.draw.rect(screen, (120, 120, 120), (bar_x, bar_y, bar_width, bar_height), 2)
+
+        self.engine.renderer.mark(pygame.draw.rect(screen, (120, 120, 120), (bar_x, bar_y, bar_width*self.engine.loadProgress(), bar_height)))
+
+class WaitingScene(Scene):
+    '''
+    Everything's loaded, waiting on the game. Nothing changes, so nothing gets drawn.
+    '''
+    name = 'WAITING'
+    caption = '(game loading...)'
+
+    def enter(self, previous: Scene) -> None:
+        self.engine.finishAssetCheck()
+
+class LogoOutScene(Scene):
+    '''
+    Blank screen to fade out to. Stops the engine once the fade's done.
+    '''
+    name = 'LOGO_OUT'
+    caption = '(goodbye!)'
+
+    def enter(self, previous: Scene) -> None:
+        self.drawn = False
+
+    def update(self) -> None:
+        # Only gets ticks once the fade out is over.
+        self.engine.run = False
+
+    def render(self, screen) -> None:
+        if not self.drawn:
+            screen.fill((0, 0, 0))
+            self.engine.renderer.markAll()
+            self.drawn = True
+
+engine_scenes = [
+    LogoInScene,
+    LoadingScene,
+    WaitingScene,
+    LogoOutScene
+]
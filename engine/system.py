@@ -2,6 +2,9 @@ import pygame, os, time
 
 from game.db import gameDatabaseAccess
 from game.validated import ValidatedDict
+from engine.common.text import TextRenderer
+from engine.common.logger import LogManager
+from engine.io.poller import InputPoller
 
 class systemTestMenu:
     '''
@@ -9,7 +12,7 @@ class systemTestMenu:
     Applies them to the database.
     '''
 
-    def __init__(self, surface: pygame.surface.Surface, resolution: tuple, clock: pygame.time.Clock, framerate: int) -> None:
+    def __init__(self, surface: pygame.surface.Surface, resolution: tuple, clock: pygame.time.Clock, framerate: int, inputs: InputPoller = None, logger: LogManager = None) -> None:
         self.testing = True
         self.current_select = 0
         self.len_settings = 0
@@ -31,6 +34,14 @@ class systemTestMenu:
         self.clock = clock
         self.framerate = framerate
         self.header_text = ''
+        self.text = TextRenderer.shared()
+
+        # For the IO test's live readout.
+        self.inputs = inputs
+        self.logger = logger
+        self.io_test_started = False
+        self.io_summary = None
+        self.io_summary_time = 0.0
 
         # Now, we should load the system font path into a var. We'll do a simple check on it to be safe.
         font_path = './assets/fonts/testmenu.ttf'
@@ -42,19 +53,8 @@ class systemTestMenu:
         self.mainTestMenu()
 
     def drawTestMenuText(self, text: str, color: tuple, surface: pygame.surface.Surface, x: int, y: int, size: int, align: int):
-        font = pygame.font.Font(self.system_font, int(size*self.resolution[1]/768))
-        textobj = font.render(text, 1, color)
-        textrect = textobj.get_rect()
-
-        if align == 0:
-            textrect.topleft = (x, y)
-        elif align == 1:
-            textrect.center = (x, y)
-        elif align == 2:
-            textrect.topright = (x, y)
-        else: raise Exception('Unknown font position! Please use 0, 1, 2!')
-
-        surface.blit(textobj, textrect)
+        # Fonts and rendered strings are cached, so redrawing the menu every frame is just blits.
+        self.text.draw(surface, self.system_font, int(size*self.resolution[1]/768), text, color, (x, y), align)
 
     def drawHeader(self, add_ud: bool, add_sel: bool, add_lr: bool, add_esc: bool):
         # I keep needing these so i made it a func
@@ -75,6 +75,45 @@ class systemTestMenu:
             self.drawTestMenuText(footer, self.text_color, self.surface, self.resolution[0]/2, int(buffer*self.resolution[1]/768), 35, 1)
             buffer += 50
 
+    def drawIOTest(self):
+        '''
+        Live readout of the input chain, for checking IO after swapping hardware. Numbers
+        start over every time the IO test gets opened.
+        '''
+        if self.inputs is None:
+            self.drawTestMenuText('No input poller running.', self.text_color, self.surface, self.resolution[0]/2, int(300*self.resolution[1]/768), 25, 1)
+            return
+
+        latency = self.inputs.latency
+        if not self.io_test_started:
+            latency.reset()
+            self.io_summary_time = 0.0
+            self.io_test_started = True
+
+        # The test menu has no game logic, so read the inputs here, or nothing gets timed.
+        self.inputs.read()
+
+        # Working out percentiles every frame is a waste, nobody reads that fast.
+        now = time.perf_counter()
+        if now-self.io_summary_time >= 0.25:
+            self.io_summary = latency.summary()
+            self.io_summary_time = now
+        summary = self.io_summary
+
+        lines = [
+            f"Polling: {summary['poll_rate']:.0f} Hz, jitter {summary['poll_jitter']:.2f} ms",
+            f"Input to game: p50 {summary['receive_to_consume']['p50']:.2f} ms, p99 {summary['receive_to_consume']['p99']:.2f} ms",
+            f"Input to screen: p50 {summary['receive_to_present']['p50']:.2f} ms, p99 {summary['receive_to_present']['p99']:.2f} ms",
+            f"Inputs measured: {summary['receive_to_present']['count']}",
+            f"P1: {self.inputs.held[0]:032b}",
+            f"P2: {self.inputs.held[1]:032b}",
+            'F10 to write to the log'
+        ]
+        buffer = int(150*self.resolution[1]/768)
+        for line in lines:
+            self.drawTestMenuText(line, self.text_color, self.surface, self.resolution[0]/2, buffer, 25, 1)
+            buffer += int(40*self.resolution[1]/768)
+
     def eventHandler(self):
         '''
         Handles game events.
@@ -117,6 +156,9 @@ class systemTestMenu:
                         self.enter_pressed = True
                         self.esc_go_back = True
                         self.kill_ud = True
+                if event.key == pygame.K_F10 and self.testing and self.test_state == 0:
+                    if self.inputs is not None and self.logger is not None:
+                        self.inputs.latency.dumpToLog(self.logger)
                 if event.key == pygame.K_ESCAPE and self.testing:
                     if self.esc_go_back:
                         self.enter_pressed = False
@@ -296,6 +338,7 @@ class systemTestMenu:
                 self.surface.fill((0, 0, 0))
                 self.header_text = 'IO Test Menu'
                 self.drawHeader(False, False, False, True)
+                self.drawIOTest()
 
             elif self.test_state == 5:
                 # All factory settings type shit
@@ -378,5 +421,9 @@ class systemTestMenu:
                         index +=1
 
             pygame.display.update()
+            if self.test_state == 0 and self.inputs is not None:
+                self.inputs.latency.presented()
+            else:
+                self.io_test_started = False
 
         return None # Send the game back to an init state.
\ No newline at end of file